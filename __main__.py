@@ -1,4 +1,5 @@
 import argparse
+import datetime
 import os
 import pathlib
 
@@ -6,15 +7,19 @@ import matplotlib.pyplot as plt
 from streamz import Stream
 
 from weather_station_stream_processing import constants
+from weather_station_stream_processing.processing.parallel import compute_counts_parallel
 from weather_station_stream_processing.tasks import compute_hourly_mean, \
     compute_station_hourly_max_temp, \
     compute_outliers, \
     compute_count_min_sketch, \
     compute_count_exact
+from weather_station_stream_processing.utils.datetime import align_to_window
+from weather_station_stream_processing.utils.time_index import read_lines_in_range
 from weather_station_stream_processing.visualization.plotter import Plotter
 
 
-def main(task: int, dataset_path: str, plot_path: str, no_title: bool, w: int, d: int):
+def main(task: int, dataset_path: str, plot_path: str, no_title: bool, w: int, d: int, n_workers: int = 1,
+         start: datetime.datetime = None, end: datetime.datetime = None):
     """Perform computations and get plots for the tasks described in the README
 
     :param task: task index
@@ -23,8 +28,19 @@ def main(task: int, dataset_path: str, plot_path: str, no_title: bool, w: int, d
     :param no_title: omit title from plots or not
     :param w: the w parameter for the Min-count sketch algorithm
     :param d: the d parameter for the Min-count sketch algorithm
+    :param n_workers: number of worker processes used to parse parts of the dataset in parallel (tasks 1, 3 and 4)
+    :param start: start of the time range of data to process (inclusive). For tasks 1 and 2 the start is aligned to the
+    first data point of the next hour (e.g. 00:00 becomes 00:05) so that the hours match those of a run over the full dataset
+    :param end: end of the time range of data to process (exclusive)
     """
 
+    if n_workers > 1 and (start is not None or end is not None):
+        raise ValueError('Processing a time range is not supported when using multiple worker processes.')
+
+    # align start of the time range to the hours used by the hourly windows of tasks 1 and 2
+    if start is not None and task in {1, 2}:
+        start = align_to_window(start, 60, constants.DATA_GRANULARITY_MIN)
+
     # initialize stream source
     src = Stream()
 
@@ -33,12 +49,17 @@ def main(task: int, dataset_path: str, plot_path: str, no_title: bool, w: int, d
         if len(dataset_path) > 1:
             raise ValueError('Only a single dataset should be specified for task 1.')
 
-        stream = compute_hourly_mean.get_stream_for_compute_hourly_mean_temperature(src)
-        stream.sink(Plotter(plot_type='line', unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND, linewidth=0.7))
-
-        # stream data from file
-        with open(dataset_path[0], 'r') as f:
-            for line in f:
+        if n_workers > 1:
+            # compute hourly means in worker processes and stream the results
+            src.sink(Plotter(plot_type='line', unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND, linewidth=0.7))
+            for res in compute_hourly_mean.compute_hourly_mean_temperature_parallel(dataset_path[0], n_workers):
+                src.emit(res)
+        else:
+            stream = compute_hourly_mean.get_stream_for_compute_hourly_mean_temperature(src)
+            stream.sink(Plotter(plot_type='line', unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND, linewidth=0.7))
+
+            # stream data in time range from file
+            for line in read_lines_in_range(dataset_path[0], start, end):
                 src.emit(line)
 
         file_name_stem = pathlib.Path(dataset_path[0]).stem
@@ -46,12 +67,17 @@ def main(task: int, dataset_path: str, plot_path: str, no_title: bool, w: int, d
         if not no_title:
             plt.title('Hourly Mean Temperatures for {0}'.format(file_name_stem))
         plt.savefig(os.path.join(plot_path, '{0}_hourly_mean.png'.format(file_name_stem)))
-        src.visualize(os.path.join(plot_path, 'stream_task_1.png'))
+
+        # the stream diagram is only meaningful when the data is processed by the streamz pipeline
+        if n_workers <= 1:
+            src.visualize(os.path.join(plot_path, 'stream_task_1.png'))
 
     """Task 2 - Stream temperature data from the three stations and report the station with the highest hourly temperature (use the subhourly data)."""
     if task == 2:
         if len(dataset_path) <= 1:
             raise ValueError('More than one dataset should be specified for task 2.')
+        if n_workers > 1:
+            raise ValueError('Multiple worker processes are not supported for task 2.')
 
         # sources
         srcs = tuple(Stream() for _ in range(len(dataset_path)))
@@ -59,16 +85,11 @@ def main(task: int, dataset_path: str, plot_path: str, no_title: bool, w: int, d
         stream = compute_station_hourly_max_temp.get_stream_for_compute_station_with_hourly_max_temperature(srcs)
         stream.sink(Plotter(plot_type='scatter', distinct_colors=True, unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND, linewidth=0.7))
 
-        # stream data from all files simultaneously
-        files = [open(path, 'r') for path in dataset_path]
-        for lines in zip(*files):
+        # stream data in time range from all files simultaneously
+        for lines in zip(*(read_lines_in_range(path, start, end) for path in dataset_path)):
             for idx, source in enumerate(srcs):
                 source.emit(lines[idx])
 
-        # close files
-        for file in files:
-            file.close()
-
         yticks_range = range(1, len(dataset_path) + 1)
         plt.yticks(yticks_range, ['Station {0}'.format(idx) for idx in yticks_range])
         if not no_title:
@@ -81,12 +102,17 @@ def main(task: int, dataset_path: str, plot_path: str, no_title: bool, w: int, d
         if len(dataset_path) > 1:
             raise ValueError('Only a single dataset should be specified for task 3.')
 
-        stream = compute_outliers.get_stream_for_compute_outliers(src)
-        stream.sink(Plotter(plot_type='marked-line', unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND, linewidth=0.7))
-
-        # stream data from file
-        with open(dataset_path[0], 'r') as f:
-            for line in f:
+        if n_workers > 1:
+            # compute outliers in worker processes and stream the results
+            src.sink(Plotter(plot_type='marked-line', unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND, linewidth=0.7))
+            for res in compute_outliers.compute_outliers_for_dataset_parallel(dataset_path[0], n_workers):
+                src.emit(res)
+        else:
+            stream = compute_outliers.get_stream_for_compute_outliers(src)
+            stream.sink(Plotter(plot_type='marked-line', unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND, linewidth=0.7))
+
+            # stream data in time range from file
+            for line in read_lines_in_range(dataset_path[0], start, end):
                 src.emit(line)
 
         file_name_stem = pathlib.Path(dataset_path[0]).stem
@@ -94,7 +120,10 @@ def main(task: int, dataset_path: str, plot_path: str, no_title: bool, w: int, d
         if not no_title:
             plt.title('Temperatures for {0} with marked outliers'.format(file_name_stem), fontsize=11)
         plt.savefig(os.path.join(plot_path, '{0}_outliers.png'.format(file_name_stem)))
-        src.visualize(os.path.join(plot_path, 'stream_task_3.png'))
+
+        # the stream diagram is only meaningful when the data is processed by the streamz pipeline
+        if n_workers <= 1:
+            src.visualize(os.path.join(plot_path, 'stream_task_3.png'))
 
     """Task 4 - Count the number of the times the temperature in one of the stations is is between -10 and 30 divided in 5. Implement the count-min sketch algorithm."""
     if task == 4:
@@ -105,12 +134,17 @@ def main(task: int, dataset_path: str, plot_path: str, no_title: bool, w: int, d
         _UNICODE_INF = '\u221e'
         _UNICODE_DEGC = '\u2103'
 
-        (stream_cms, cms), bucket_intervals = compute_count_min_sketch.get_stream_for_compute_count_min_sketch(src, w=w, d=d)
-        (stream_exact, exact), _ = compute_count_exact.get_stream_for_compute_count_exact(src)
-
-        # stream data from file
-        with open(dataset_path[0], 'r') as f:
-            for line in f:
+        if n_workers > 1:
+            # update partial counts in worker processes and merge them
+            cms, bucket_intervals = compute_count_min_sketch.get_count_min_sketch(w=w, d=d)
+            exact, _ = compute_count_exact.get_count_exact()
+            compute_counts_parallel(dataset_path[0], constants.TEMP_COL_NAME, (cms, exact), n_workers)
+        else:
+            (stream_cms, cms), bucket_intervals = compute_count_min_sketch.get_stream_for_compute_count_min_sketch(src, w=w, d=d)
+            (stream_exact, exact), _ = compute_count_exact.get_stream_for_compute_count_exact(src)
+
+            # stream data in time range from file
+            for line in read_lines_in_range(dataset_path[0], start, end):
                 src.emit(line)
 
         # value to add to bucket limits to get query values
@@ -137,7 +171,10 @@ def main(task: int, dataset_path: str, plot_path: str, no_title: bool, w: int, d
         if not no_title:
             ax.set_title('Counts of Bucketed temperatures')
         plt.savefig(os.path.join(plot_path, '{0}_counts.png'.format(pathlib.Path(dataset_path[0]).stem)))
-        src.visualize(os.path.join(plot_path, 'stream_task_4.png'))
+
+        # the stream diagram is only meaningful when the data is processed by the streamz pipeline
+        if n_workers <= 1:
+            src.visualize(os.path.join(plot_path, 'stream_task_4.png'))
 
 
 if __name__ == '__main__':
@@ -154,5 +191,12 @@ if __name__ == '__main__':
     parser.add_argument("--no-title", action='store_true', help='omit title from plots')
     parser.add_argument("--w", type=int, default=4, help='the w parameter for the Min-count sketch algorithm')
     parser.add_argument("--d", type=int, default=5, help='the d parameter for the Min-count sketch algorithm')
+    parser.add_argument("--start", type=datetime.datetime.fromisoformat, default=None,
+                        help='start of the time range of data to process in ISO format (e.g. 2021-06-01T12:00, inclusive, '
+                             'aligned to the first data point of the next hour for tasks 1 and 2)')
+    parser.add_argument("--end", type=datetime.datetime.fromisoformat, default=None,
+                        help='end of the time range of data to process in ISO format (e.g. 2021-06-08, exclusive)')
+    parser.add_argument("--n-workers", type=int, default=1, help='number of worker processes used to parse parts of the dataset in parallel (tasks 1, 3 and 4)')
     args = parser.parse_args()
-    main(args.task, args.dataset_path if args.task != 2 else default_datasets_task2, args.plot_dir_path, args.no_title, args.w, args.d)
+    main(args.task, args.dataset_path if args.task != 2 else default_datasets_task2, args.plot_dir_path, args.no_title, args.w, args.d, args.n_workers,
+         args.start, args.end)
@@ -25,6 +25,9 @@ DATA_POINT_COLS_CHARS = ["WBANNO",
 TEMP_COL_NAME = DATA_POINT_COLS_CHARS[8]
 DATE_COL_NAME = DATA_POINT_COLS_CHARS[1]
 TIME_COL_NAME = DATA_POINT_COLS_CHARS[2]
+STATION_COL_NAME = DATA_POINT_COLS_CHARS[0]
+LON_COL_NAME = DATA_POINT_COLS_CHARS[6]
+LAT_COL_NAME = DATA_POINT_COLS_CHARS[7]
 
 TEMP_COL_NAME_UNK_VAL_IND = -9999.0
 
@@ -1,6 +1,6 @@
 import math
 import os
-from typing import Tuple
+from typing import Callable, Iterable, Tuple, Union
 
 import mmh3
 import numpy as np
@@ -71,8 +71,8 @@ class CountMinSketch:
             # number of bytes needed to represent the index of and assigned bucket (used for hashing)
             self._n_bytes_for_bucket_index = int(math.log(((self.high_bound - self.low_bound) / self.step) + 2, 256)) + 1
 
-        hash_func_seeds = [int.from_bytes(os.urandom(16), 'big') for _ in range(self.d)]
-        self._hash_funcs = [lambda x, s=seed: mmh3.hash(x, s) for seed in hash_func_seeds]
+        # seeds of the hash functions (kept instead of the hash functions themselves so that instances can be pickled)
+        self._hash_func_seeds = [int.from_bytes(os.urandom(4), 'big') for _ in range(self.d)]
         self._cms_mat = np.zeros((self.d, self.w), dtype=int)
 
     def _ind_cols_cms_mat(self, x):
@@ -81,7 +81,7 @@ class CountMinSketch:
         :param x: value for which to compute the column indices
         :return: the computed column indices
         """
-        return [self._hash_funcs[idx](x) % self.w for idx in range(len(self._hash_funcs))]
+        return [mmh3.hash(x, seed) % self.w for seed in self._hash_func_seeds]
 
     def _increment(self, x):
         """Increment applicable values in the Count-min sketch matrix for a given value.
@@ -106,6 +106,17 @@ class CountMinSketch:
             ind_cols = self._ind_cols_cms_mat(x)
         return np.min(self._cms_mat[np.arange(self._cms_mat.shape[0]), ind_cols])
 
+    def merge(self, other: 'CountMinSketch'):
+        """Merge another Count-min sketch instance into this one.
+
+        :param other: Count-min sketch instance to merge into this one (should be a copy of this instance updated with other data)
+        :return: this instance
+        """
+        if self._hash_func_seeds != other._hash_func_seeds or self._cms_mat.shape != other._cms_mat.shape:
+            raise ValueError('Only Count-min sketch instances with the same dimensions and hash functions can be merged.')
+        self._cms_mat += other._cms_mat
+        return self
+
     def __call__(self, x):
         """Pass next data point to the Count-min sketch implementation.
 
@@ -163,6 +174,16 @@ class CountExact:
         else:
             return self._counts[x] if x in self._counts else 0
 
+    def merge(self, other: 'CountExact'):
+        """Merge another exact counting instance into this one.
+
+        :param other: exact counting instance to merge into this one
+        :return: this instance
+        """
+        for k, v in other._counts.items():
+            self._counts[k] = self._counts.get(k, 0) + v
+        return self
+
     def __call__(self, x):
         """Pass next data point to the exact counting implementation.
 
@@ -181,6 +202,133 @@ class CountExact:
             self._counts[x] += 1
 
 
+class HyperLogLog:
+    def __init__(self, p: int = 14, seed: int = 0, unk_val=None):
+        """HyperLogLog algorithm implementation for approximate counting of distinct values.
+
+        Instances constructed with the same precision and seed can be merged, which allows sketches computed
+        over different parts of a stream to be combined.
+
+        :param p: precision (number of bits of the hash used to select a register, the number of registers is 2^p)
+        :param seed: seed of the hash function (sketches can only be merged if their seeds match)
+        :param unk_val: value signaling a missing/unknown value
+        """
+
+        if not 4 <= p <= 18:
+            raise ValueError('The precision should be between 4 and 18.')
+
+        self.p = p
+        self.m = 1 << p
+        self.seed = seed
+
+        self.unk_val = unk_val
+
+        self._registers = np.zeros(self.m, dtype=np.uint8)
+
+    @property
+    def _alpha(self):
+        """Bias correction constant for the number of registers."""
+        if self.m == 16:
+            return 0.673
+        elif self.m == 32:
+            return 0.697
+        elif self.m == 64:
+            return 0.709
+        else:
+            return 0.7213 / (1 + 1.079 / self.m)
+
+    @staticmethod
+    def _to_bytes(x):
+        """Get byte representation of a value used for hashing.
+
+        :param x: value to represent as bytes
+        :return: byte representation of the value
+        """
+        if isinstance(x, bytes):
+            return x
+        if isinstance(x, tuple):
+            return '\x1f'.join(map(str, x)).encode()
+        return str(x).encode()
+
+    def _hash(self, x):
+        """Compute the 64-bit hash of a given value.
+
+        :param x: value to hash
+        :return: the computed hash as an unsigned integer
+        """
+        return mmh3.hash64(self._to_bytes(x), self.seed, signed=False)[0]
+
+    def _add(self, x):
+        """Update the registers for a given value.
+
+        :param x: value for which to update the registers
+        """
+        h = self._hash(x)
+        idx = h >> (64 - self.p)
+        w = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - w.bit_length() + 1
+        if rank > self._registers[idx]:
+            self._registers[idx] = rank
+
+    def update(self, xs: Iterable):
+        """Pass a batch of data points to the HyperLogLog implementation.
+
+        :param xs: data points passed to the HyperLogLog implementation
+        """
+        hashes = np.fromiter((self._hash(x) for x in xs if not (self.unk_val and x == self.unk_val)), dtype=np.uint64)
+        if len(hashes) == 0:
+            return
+
+        # register indices and ranks (position of the leftmost set bit in the remaining bits) of the hashes
+        n_rem_bits = 64 - self.p
+        idxs = (hashes >> np.uint64(n_rem_bits)).astype(np.intp)
+        ws = hashes & np.uint64((1 << n_rem_bits) - 1)
+        bit_lengths = np.zeros(len(ws), dtype=np.int64)
+        for shift in (32, 16, 8, 4, 2, 1):
+            mask = ws >= np.uint64(1 << shift)
+            bit_lengths[mask] += shift
+            ws[mask] >>= np.uint64(shift)
+        bit_lengths += (ws > 0)
+        ranks = (n_rem_bits - bit_lengths + 1).astype(np.uint8)
+        np.maximum.at(self._registers, idxs, ranks)
+
+    def merge(self, other: 'HyperLogLog'):
+        """Merge another HyperLogLog instance into this one.
+
+        :param other: HyperLogLog instance to merge into this one
+        :return: this instance
+        """
+        if self.p != other.p or self.seed != other.seed:
+            raise ValueError('Only HyperLogLog instances with the same precision and seed can be merged.')
+        np.maximum(self._registers, other._registers, out=self._registers)
+        return self
+
+    def query(self):
+        """Query the HyperLogLog implementation for an approximation of the number of distinct values.
+
+        :return: approximated number of distinct values
+        """
+        raw_estimate = self._alpha * self.m ** 2 / np.sum(np.power(2.0, -self._registers.astype(np.float64)))
+
+        # use linear counting for small cardinalities
+        n_zero_registers = int(np.count_nonzero(self._registers == 0))
+        if raw_estimate <= 2.5 * self.m and n_zero_registers > 0:
+            return self.m * math.log(self.m / n_zero_registers)
+        return raw_estimate
+
+    def __call__(self, x):
+        """Pass next data point or a list of data points to the HyperLogLog implementation.
+
+        :param x: data point or list of data points passed to the HyperLogLog implementation
+        """
+        if isinstance(x, list):
+            self.update(x)
+            return
+        if self.unk_val and x == self.unk_val:
+            return
+        self._add(x)
+
+
 def compute_min_sketch_count(upstream: Stream,
                              col_name: str,
                              w,
@@ -245,3 +393,50 @@ def compute_exact_count(upstream: Stream,
 
     # return the stream for computing the count and the exact counting implementation instance
     return stream_exact_count_bucketed, ce
+
+
+def compute_hyperloglog_distinct_count(upstream: Stream,
+                                       col_name: Union[str, Tuple[str, ...]] = None,
+                                       p: int = 14,
+                                       seed: int = 0,
+                                       unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND,
+                                       key: Callable[[dict], object] = None
+                                       ) -> Tuple[Stream, HyperLogLog]:
+    """Compute an approximate count of distinct values using the HyperLogLog algorithm. The stream updates the registers of the
+    HyperLogLog algorithm. The instance encapsulating the HyperLogLog algorithm can be queried to obtain the approximate count.
+
+    The upstream can emit single data points or lists of data points (e.g. chunks of lines read from a file) in which case the
+    registers are updated for each list at once.
+
+    :param upstream: upstream
+    :param col_name: name of data column containing the value of interest or a tuple of names of data columns whose
+    combined values are counted (e.g. station and date). Ignored if key is specified
+    :param p: precision of the HyperLogLog algorithm (the number of registers is 2^p)
+    :param seed: seed of the hash function
+    :param unk_val: value signaling a missing/unknown value (only applicable if a single column is specified)
+    :param key: function mapping an annotated data point to the value that is counted, for values derived from the data
+    columns (e.g. station and hour with lambda x: (x['WBANNO'], x['UTC_DATE'], x['UTC_TIME'][:2]))
+    :return: the resulting stream and the HyperLogLog implementation instance
+    """
+
+    if col_name is None and key is None:
+        raise ValueError('Either the name of the data column or the key function should be specified.')
+
+    single_col = key is None and isinstance(col_name, str)
+    hll = HyperLogLog(p=p, seed=seed, unk_val=unk_val if single_col else None)
+
+    # get value of interest from data point
+    def get_value(pt):
+        x = annotation.annotate(pt)
+        if key is not None:
+            return key(x)
+        return float(x[col_name]) if single_col else tuple(x[c] for c in col_name)
+
+    # stream of specified data (lists of data points are mapped to lists of values)
+    stream_data_annotated = upstream.map(lambda x: [get_value(pt) for pt in x] if isinstance(x, list) else get_value(x))
+
+    # stream for updating the HyperLogLog registers
+    stream_hyperloglog = stream_data_annotated.sink(hll)
+
+    # return the stream for computing the distinct count and the HyperLogLog implementation instance
+    return stream_hyperloglog, hll
@@ -3,6 +3,8 @@ from typing import Tuple
 import streamz
 from streamz import Stream
 
+from weather_station_stream_processing import constants
+from weather_station_stream_processing.processing.running_window import RunningWindowAggregate
 from weather_station_stream_processing.utils import annotation
 from weather_station_stream_processing.utils.datetime import to_standard_format
 
@@ -40,3 +42,43 @@ def compute_index_tuple_max_for_minutes(upstreams: Tuple[Stream],
 
     # returned zipped stream of dates and the stream of indices of points with maximal specified value
     return stream_dates.zip_latest(stream_index_max)
+
+
+def compute_index_tuple_max_for_minutes_early_firing(upstreams: Tuple[Stream],
+                                                     col_name: str,
+                                                     date_col_name: str,
+                                                     time_col_name: str,
+                                                     minutes: int = 60,
+                                                     data_granularity_minutes: int = 5,
+                                                     unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND,
+                                                     fire_every: int = 1
+                                                     ) -> Stream:
+    """Compute index of the upstream with the maximal value for minutes with partial results fired before the windows are complete.
+    The upstreams should be emitted to in lockstep. The stream returns a tuple of the starting datetime of the window and the index
+    of the upstream with the maximal value seen so far and a flag indicating if the result is final.
+
+    :param upstreams: upstreams
+    :param col_name: name of data column containing the value of interest
+    :param date_col_name: name of data column containing the date
+    :param time_col_name: name of data column containing the time
+    :param minutes: size of window in minutes
+    :param data_granularity_minutes: data granularity in minutes
+    :param unk_val: value signaling a missing/unknown value
+    :param fire_every: number of data points after which a partial result is fired
+    :return: the resulting stream
+    """
+
+    # compute the date of the first upstream, the index of the upstream with the maximal value and a flag indicating if the result is final
+    def index_max(results):
+        vals = [res[0][1] for res in results]
+        return (results[0][0][0], vals.index(max(vals)) + 1), results[0][1]
+
+    # streams of partial and final maximum values
+    streams_max = [stream.map(annotation.annotate)
+                   .map(lambda x: (to_standard_format(x[date_col_name], x[time_col_name]), float(x[col_name])))
+                   .map(RunningWindowAggregate(minutes // data_granularity_minutes, aggregate='max', fire_every=fire_every, unk_val=unk_val))
+                   .flatten()
+                   for stream in upstreams]
+
+    # return stream of dates of the first upstream and indices of the upstreams with the maximal values
+    return streamz.zip(*streams_max).map(index_max)
@@ -0,0 +1,521 @@
+import datetime
+import math
+from typing import Tuple
+
+import numpy as np
+from streamz import Stream
+
+from weather_station_stream_processing import constants
+from weather_station_stream_processing.utils import annotation
+from weather_station_stream_processing.utils.datetime import EPOCH, to_standard_format, window_index, window_start
+
+
+def _minutes(dt: datetime.datetime) -> int:
+    """Get number of minutes since the epoch for a given datetime."""
+    return (dt - EPOCH) // datetime.timedelta(minutes=1)
+
+
+class KeyedStateTable:
+    def __init__(self, fields: Tuple[str, ...], initial_capacity: int = 1024):
+        """Table of per-key state stored in preallocated numpy arrays (one array per field) indexed by slots assigned to keys.
+        Slots of evicted keys are reused.
+
+        :param fields: names of the state fields
+        :param initial_capacity: initial number of slots (the capacity is doubled when all slots are used)
+        """
+
+        self._slots = dict()
+        self._free_slots = []
+        self._n_used = 0
+        self._cols = {field: np.zeros(initial_capacity, dtype=np.float64) for field in fields}
+
+        # time of the latest data point of the key in each slot in minutes since the epoch (-1 for unused slots)
+        self._last_seen = np.full(initial_capacity, -1, dtype=np.int64)
+
+    def _grow(self):
+        """Double the capacity of the table."""
+        capacity = len(self._last_seen)
+        for field, col in self._cols.items():
+            self._cols[field] = np.concatenate((col, np.zeros(capacity, dtype=np.float64)))
+        self._last_seen = np.concatenate((self._last_seen, np.full(capacity, -1, dtype=np.int64)))
+
+    def slot(self, key, dt: datetime.datetime) -> Tuple[int, bool]:
+        """Get slot of a key and mark the key as seen at a given time. A slot with zeroed state is assigned to new keys.
+
+        :param key: the key
+        :param dt: datetime of the data point of the key
+        :return: the slot and a flag indicating if the key is new
+        """
+
+        slot = self._slots.get(key)
+        is_new = slot is None
+        if is_new:
+            if self._free_slots:
+                slot = self._free_slots.pop()
+            else:
+                if self._n_used == len(self._last_seen):
+                    self._grow()
+                slot = self._n_used
+                self._n_used += 1
+            for col in self._cols.values():
+                col[slot] = 0.0
+            self._slots[key] = slot
+        self._last_seen[slot] = _minutes(dt)
+        return slot, is_new
+
+    def evict_idle(self, now: datetime.datetime, idle_minutes: int, on_evict=None) -> list:
+        """Evict keys not seen for a given number of minutes.
+
+        :param now: current datetime
+        :param idle_minutes: number of minutes after which a key not seen is evicted
+        :param on_evict: function called with the key and the slot of each evicted key before the slot is freed
+        :return: list of evicted keys and their slots
+        """
+
+        threshold = _minutes(now) - idle_minutes
+        idle_slots = set(np.flatnonzero((self._last_seen >= 0) & (self._last_seen < threshold)).tolist())
+        if not idle_slots:
+            return []
+
+        evicted = [(key, slot) for key, slot in self._slots.items() if slot in idle_slots]
+        for key, slot in evicted:
+            if on_evict is not None:
+                on_evict(key, slot)
+            del self._slots[key]
+        self._last_seen[list(idle_slots)] = -1
+        self._free_slots.extend(idle_slots)
+        return evicted
+
+    def live_slots(self) -> np.ndarray:
+        """Get slots assigned to keys.
+
+        :return: array of the slots assigned to keys
+        """
+        return np.flatnonzero(self._last_seen >= 0)
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self._cols[field]
+
+    def __contains__(self, key):
+        return key in self._slots
+
+    def __len__(self):
+        return len(self._slots)
+
+
+class _KeyedOperator:
+    def __init__(self,
+                 fields: Tuple[str, ...],
+                 key_col_name: str,
+                 date_col_name: str,
+                 time_col_name: str,
+                 idle_minutes: int,
+                 evict_every: int
+                 ):
+        """Base class for operators keeping per-key state for an interleaved stream of keys.
+
+        :param fields: names of the state fields
+        :param key_col_name: name of data column containing the key
+        :param date_col_name: name of data column containing the date
+        :param time_col_name: name of data column containing the time
+        :param idle_minutes: number of minutes after which the state of a key not seen is evicted
+        :param evict_every: number of data points after which idle keys are evicted
+        """
+
+        self._key_col_name = key_col_name
+        self._date_col_name = date_col_name
+        self._time_col_name = time_col_name
+        self._idle_minutes = idle_minutes
+        self._evict_every = evict_every
+
+        self.state = KeyedStateTable(fields)
+
+        self._n_processed = 0
+        self._now = None
+
+    def _on_evict(self, key, slot, res: list):
+        """Handle eviction of a key before its slot is freed.
+
+        :param key: the evicted key
+        :param slot: slot of the evicted key
+        :param res: list to which to append results for the evicted key
+        """
+        pass
+
+    def _slot(self, pt, res: list) -> Tuple[object, datetime.datetime, int, bool]:
+        """Get key, datetime and slot of an annotated data point and periodically evict idle keys.
+
+        :param pt: annotated data point
+        :param res: list to which to append results for the evicted keys
+        :return: the key, the datetime, the slot and a flag indicating if the key is new
+        """
+
+        key = pt[self._key_col_name]
+        dt = to_standard_format(pt[self._date_col_name], pt[self._time_col_name])
+        if self._now is None or dt > self._now:
+            self._now = dt
+
+        self._n_processed += 1
+        if self._n_processed % self._evict_every == 0:
+            self.state.evict_idle(self._now, self._idle_minutes, on_evict=lambda k, s: self._on_evict(k, s, res))
+
+        slot, is_new = self.state.slot(key, dt)
+        return key, dt, slot, is_new
+
+
+class KeyedWindowAggregate(_KeyedOperator):
+    def __init__(self,
+                 col_name: str,
+                 date_col_name: str,
+                 time_col_name: str,
+                 key_col_name: str = constants.STATION_COL_NAME,
+                 aggregate: str = 'mean',
+                 minutes: int = 60,
+                 data_granularity_minutes: int = 5,
+                 unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND,
+                 idle_minutes: int = 24 * 60,
+                 evict_every: int = 10000
+                 ):
+        """Aggregate values over windows of time separately for each key of an interleaved stream of keys.
+
+        :param col_name: name of data column containing the value of interest
+        :param date_col_name: name of data column containing the date
+        :param time_col_name: name of data column containing the time
+        :param key_col_name: name of data column containing the key
+        :param aggregate: aggregate to compute. Valid values are 'mean' and 'max'
+        :param minutes: size of the window in minutes
+        :param data_granularity_minutes: data granularity in minutes
+        :param unk_val: value signaling a missing/unknown value
+        :param idle_minutes: number of minutes after which the state of a key not seen is evicted
+        :param evict_every: number of data points after which idle keys are evicted
+        """
+
+        if aggregate not in {'mean', 'max'}:
+            raise ValueError('Value of argument aggregate should be \'mean\' or \'max\'.')
+
+        super().__init__(('window', 'sum', 'count', 'max', 'n_points'), key_col_name, date_col_name, time_col_name, idle_minutes, evict_every)
+
+        self._col_name = col_name
+        self._aggregate = aggregate
+        self._minutes = minutes
+        self._data_granularity_minutes = data_granularity_minutes
+        self._n_points_in_window = minutes // data_granularity_minutes
+        self._unk_val = unk_val
+
+    def _result(self, key, slot):
+        """Get result for the current window of the key in a given slot and mark the window as emitted."""
+        s = self.state
+        if s['count'][slot] == 0:
+            val = self._unk_val
+        elif self._aggregate == 'mean':
+            val = float(s['sum'][slot] / s['count'][slot])
+        else:
+            val = float(s['max'][slot])
+        s['n_points'][slot] = -1
+        return key, (window_start(int(s['window'][slot]), self._minutes, self._data_granularity_minutes), val)
+
+    def watermark(self):
+        """Get starting datetime of the earliest window for which a result can still be emitted. Results for all earlier windows
+        were already emitted.
+
+        :return: starting datetime of the earliest window for which a result can still be emitted or None if no keys were seen
+        """
+
+        slots = self.state.live_slots()
+        if len(slots) == 0:
+            return None
+
+        # the window of a key is still open unless its result was emitted in which case only later windows of the key remain
+        s = self.state
+        idx = int(np.min(s['window'][slots] + (s['n_points'][slots] < 0)))
+        return window_start(idx, self._minutes, self._data_granularity_minutes)
+
+    def _on_evict(self, key, slot, res: list):
+        """Emit the incomplete window of an evicted key."""
+        if self.state['n_points'][slot] > 0:
+            res.append(self._result(key, slot))
+
+    def __call__(self, pt):
+        """Pass next annotated data point to the aggregation.
+
+        :param pt: annotated data point
+        :return: list of key and (starting datetime of the window, aggregate) tuples for the windows completed by the data point
+        or by the eviction of idle keys
+        """
+
+        res = []
+        key, dt, slot, is_new = self._slot(pt, res)
+        s = self.state
+
+        idx = window_index(dt, self._minutes, self._data_granularity_minutes)
+        if is_new or idx > s['window'][slot]:
+            # emit incomplete window of the key (for example if there are gaps in the data) before starting a new one
+            if not is_new and s['n_points'][slot] > 0:
+                res.append(self._result(key, slot))
+            s['window'][slot] = idx
+            s['sum'][slot] = 0.0
+            s['count'][slot] = 0
+            s['max'][slot] = -math.inf
+            s['n_points'][slot] = 0
+        elif idx < s['window'][slot] or s['n_points'][slot] < 0:
+            # data points arriving after their window was emitted are dropped
+            return res
+
+        val = float(pt[self._col_name])
+        if val != self._unk_val:
+            s['sum'][slot] += val
+            s['count'][slot] += 1
+            s['max'][slot] = max(s['max'][slot], val)
+        s['n_points'][slot] += 1
+
+        # emit window once all of its data points were seen
+        if s['n_points'][slot] >= self._n_points_in_window:
+            res.append(self._result(key, slot))
+        return res
+
+
+class KeyedOutliers(_KeyedOperator):
+    def __init__(self,
+                 col_name: str,
+                 date_col_name: str,
+                 time_col_name: str,
+                 key_col_name: str = constants.STATION_COL_NAME,
+                 unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND,
+                 std_outlier_criteria: float = 3.0,
+                 idle_minutes: int = 24 * 60,
+                 evict_every: int = 10000
+                 ):
+        """Mark outliers separately for each key of an interleaved stream of keys by examining how many standard deviations
+        from the mean of the data of the key observed so far a new value lies.
+
+        :param col_name: name of data column containing the value of interest
+        :param date_col_name: name of data column containing the date
+        :param time_col_name: name of data column containing the time
+        :param key_col_name: name of data column containing the key
+        :param unk_val: value signaling a missing/unknown value
+        :param std_outlier_criteria: how many standard deviations away from the mean
+        should a value be considered an outlier
+        :param idle_minutes: number of minutes after which the state of a key not seen is evicted
+        :param evict_every: number of data points after which idle keys are evicted
+        """
+
+        super().__init__(('mean', 'var', 'count'), key_col_name, date_col_name, time_col_name, idle_minutes, evict_every)
+
+        self._col_name = col_name
+        self._unk_val = unk_val
+        self._std_outlier_criteria = std_outlier_criteria
+
+    def __call__(self, pt):
+        """Pass next annotated data point to the outlier detection.
+
+        :param pt: annotated data point
+        :return: key and ((datetime, value), outlier flag) tuple
+        """
+
+        key, dt, slot, _ = self._slot(pt, [])
+        s = self.state
+        val = float(pt[self._col_name])
+
+        # mean and standard deviation of the values of the key preceding the value (computed as in StreamedMeanStd)
+        prev_mean = float(s['mean'][slot])
+        prev_var = float(s['var'][slot])
+        std = math.sqrt(prev_var if abs(prev_var) > 1.0e-16 else 0.0)
+
+        if val != self._unk_val:
+            count = s['count'][slot]
+            s['mean'][slot] = ((prev_mean * count) + val) / (count + 1)
+            s['var'][slot] = ((prev_var + prev_mean ** 2) * count + val ** 2) / (count + 1) - s['mean'][slot] ** 2
+            s['count'][slot] = count + 1
+
+        is_outlier = val > prev_mean + self._std_outlier_criteria * std or val < prev_mean - self._std_outlier_criteria * std
+        return key, ((dt, val), is_outlier)
+
+
+class WindowIndexMax:
+    def __init__(self, aggregate: KeyedWindowAggregate = None):
+        """Find the key with the maximal value for each window from a stream of key and (starting datetime of the window, value) tuples.
+
+        If the aggregate producing the tuples is specified, the values for each window are buffered until the watermark of the aggregate
+        passes the window so that late results (e.g. for incomplete windows of evicted keys or of keys with gaps in the data) are taken
+        into account. Otherwise the result for a window is emitted when a value for a later window arrives.
+
+        :param aggregate: aggregate producing the key and (starting datetime of the window, value) tuples
+        """
+
+        self._aggregate = aggregate
+
+        # mapping of starting datetimes of the windows not yet emitted to the maximal values and the keys with the maximal values
+        self._max = dict()
+
+        # starting datetime of the latest emitted window
+        self._emitted = None
+
+        # number of values dropped because the result for their window was already emitted
+        self.n_dropped = 0
+
+    def __call__(self, x):
+        """Pass next key and (starting datetime of the window, value) tuple or a list of such tuples (e.g. the results of the aggregate
+        for a data point).
+
+        :param x: key and (starting datetime of the window, value) tuple or list of such tuples
+        :return: list of (starting datetime of the window, key with the maximal value) tuples for completed windows
+        """
+
+        xs = x if isinstance(x, list) else [x]
+        if not xs:
+            return []
+        for key, (dt, val) in xs:
+            if self._emitted is not None and dt <= self._emitted:
+                self.n_dropped += 1
+            elif dt not in self._max or val > self._max[dt][0]:
+                self._max[dt] = (val, key)
+        if not self._max:
+            return []
+
+        # emit windows that can no longer receive values in timestamp order
+        watermark = self._aggregate.watermark() if self._aggregate is not None else max(self._max)
+        res = []
+        for window in sorted(w for w in self._max if watermark is None or w < watermark):
+            res.append((window, self._max.pop(window)[1]))
+            self._emitted = window
+        return res
+
+
+def compute_keyed_mean_for_minutes(upstream: Stream,
+                                   col_name: str,
+                                   date_col_name: str,
+                                   time_col_name: str,
+                                   key_col_name: str = constants.STATION_COL_NAME,
+                                   minutes: int = 60,
+                                   data_granularity_minutes: int = 5,
+                                   unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND,
+                                   idle_minutes: int = 24 * 60,
+                                   evict_every: int = 10000
+                                   ) -> Stream:
+    """Compute mean for minutes separately for each key (e.g. station) of an interleaved stream of keys. The stream returns the key and
+    a tuple of the starting datetime of the window and the mean as a tuple.
+
+    :param upstream: upstream
+    :param col_name: name of data column containing the value of interest
+    :param date_col_name: name of data column containing the date
+    :param time_col_name: name of data column containing the time
+    :param key_col_name: name of data column containing the key
+    :param minutes: size of averaging window in minutes
+    :param data_granularity_minutes: data granularity in minutes
+    :param unk_val: value signaling a missing/unknown value
+    :param idle_minutes: number of minutes after which the state of a key not seen is evicted
+    :param evict_every: number of data points after which idle keys are evicted
+    :return: the resulting stream
+    """
+
+    aggregate = KeyedWindowAggregate(col_name, date_col_name, time_col_name, key_col_name, aggregate='mean', minutes=minutes,
+                                     data_granularity_minutes=data_granularity_minutes, unk_val=unk_val, idle_minutes=idle_minutes,
+                                     evict_every=evict_every)
+
+    # return flattened stream of results for completed windows
+    return upstream.map(annotation.annotate).map(aggregate).flatten()
+
+
+def compute_keyed_max_for_minutes(upstream: Stream,
+                                  col_name: str,
+                                  date_col_name: str,
+                                  time_col_name: str,
+                                  key_col_name: str = constants.STATION_COL_NAME,
+                                  minutes: int = 60,
+                                  data_granularity_minutes: int = 5,
+                                  unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND,
+                                  idle_minutes: int = 24 * 60,
+                                  evict_every: int = 10000
+                                  ) -> Stream:
+    """Compute maximum for minutes separately for each key (e.g. station) of an interleaved stream of keys. The stream returns the key and
+    a tuple of the starting datetime of the window and the maximum as a tuple.
+
+    :param upstream: upstream
+    :param col_name: name of data column containing the value of interest
+    :param date_col_name: name of data column containing the date
+    :param time_col_name: name of data column containing the time
+    :param key_col_name: name of data column containing the key
+    :param minutes: size of window in minutes
+    :param data_granularity_minutes: data granularity in minutes
+    :param unk_val: value signaling a missing/unknown value
+    :param idle_minutes: number of minutes after which the state of a key not seen is evicted
+    :param evict_every: number of data points after which idle keys are evicted
+    :return: the resulting stream
+    """
+
+    aggregate = KeyedWindowAggregate(col_name, date_col_name, time_col_name, key_col_name, aggregate='max', minutes=minutes,
+                                     data_granularity_minutes=data_granularity_minutes, unk_val=unk_val, idle_minutes=idle_minutes,
+                                     evict_every=evict_every)
+
+    # return flattened stream of results for completed windows
+    return upstream.map(annotation.annotate).map(aggregate).flatten()
+
+
+def compute_keyed_index_max_for_minutes(upstream: Stream,
+                                        col_name: str,
+                                        date_col_name: str,
+                                        time_col_name: str,
+                                        key_col_name: str = constants.STATION_COL_NAME,
+                                        minutes: int = 60,
+                                        data_granularity_minutes: int = 5,
+                                        unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND,
+                                        idle_minutes: int = 24 * 60,
+                                        evict_every: int = 10000
+                                        ) -> Stream:
+    """Compute key (e.g. station) with the maximal value for minutes from an interleaved stream of keys ordered by time. The stream
+    returns the starting datetime of the window and the key with the maximal value as a tuple. The result for a window is emitted
+    once all keys have emitted their maxima for the window or were evicted.
+
+    :param upstream: upstream
+    :param col_name: name of data column containing the value of interest
+    :param date_col_name: name of data column containing the date
+    :param time_col_name: name of data column containing the time
+    :param key_col_name: name of data column containing the key
+    :param minutes: size of window in minutes
+    :param data_granularity_minutes: data granularity in minutes
+    :param unk_val: value signaling a missing/unknown value
+    :param idle_minutes: number of minutes after which the state of a key not seen is evicted
+    :param evict_every: number of data points after which idle keys are evicted
+    :return: the resulting stream
+    """
+
+    aggregate = KeyedWindowAggregate(col_name, date_col_name, time_col_name, key_col_name, aggregate='max', minutes=minutes,
+                                     data_granularity_minutes=data_granularity_minutes, unk_val=unk_val, idle_minutes=idle_minutes,
+                                     evict_every=evict_every)
+
+    # return flattened stream of results for windows passed by the watermark of the aggregate (the results of the aggregate for
+    # each data point are passed at once as the watermark already reflects all of them)
+    return upstream.map(annotation.annotate).map(aggregate) \
+        .map(WindowIndexMax(aggregate)) \
+        .flatten()
+
+
+def compute_keyed_outliers(upstream: Stream,
+                           col_name: str,
+                           date_col_name: str,
+                           time_col_name: str,
+                           key_col_name: str = constants.STATION_COL_NAME,
+                           unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND,
+                           std_outlier_criteria: float = 3.0,
+                           idle_minutes: int = 24 * 60,
+                           evict_every: int = 10000
+                           ) -> Stream:
+    """Compute outliers separately for each key (e.g. station) of an interleaved stream of keys. The stream returns the key and a tuple
+    of the date and time and value tuple and a flag indicating if the value is an outlier.
+
+    :param upstream: upstream
+    :param col_name: name of data column containing the value of interest
+    :param date_col_name: name of data column containing the date
+    :param time_col_name: name of data column containing the time
+    :param key_col_name: name of data column containing the key
+    :param unk_val: value signaling a missing/unknown value
+    :param std_outlier_criteria: how many standard deviations away from the mean
+    should a value be considered an outlier
+    :param idle_minutes: number of minutes after which the state of a key not seen is evicted
+    :param evict_every: number of data points after which idle keys are evicted
+    :return: the resulting stream
+    """
+
+    return upstream.map(annotation.annotate).map(KeyedOutliers(col_name, date_col_name, time_col_name, key_col_name, unk_val=unk_val,
+                                                               std_outlier_criteria=std_outlier_criteria, idle_minutes=idle_minutes,
+                                                               evict_every=evict_every))
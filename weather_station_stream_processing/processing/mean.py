@@ -1,6 +1,7 @@
 from streamz import Stream
 
 from weather_station_stream_processing import constants
+from weather_station_stream_processing.processing.running_window import RunningWindowAggregate
 from weather_station_stream_processing.utils import annotation
 from weather_station_stream_processing.utils.datetime import to_standard_format
 
@@ -44,3 +45,36 @@ def compute_mean_for_minutes(upstream: Stream,
 
     # return zipped stream of dates for partitions and the stream of means of partitions
     return stream_datetime.zip_latest(stream_mean)
+
+
+def compute_mean_for_minutes_early_firing(upstream: Stream,
+                                          col_name: str,
+                                          date_col_name: str,
+                                          time_col_name: str,
+                                          minutes: int = 60,
+                                          data_granularity_minutes: int = 5,
+                                          unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND,
+                                          fire_every: int = 1
+                                          ) -> Stream:
+    """Compute mean for minutes with partial means fired before the windows are complete. The stream returns a tuple of the starting
+    datetime of the window and the mean of the data points seen so far and a flag indicating if the mean is final.
+
+    :param upstream: upstream
+    :param col_name: name of data column containing the value of interest
+    :param date_col_name: name of data column containing the date
+    :param time_col_name: name of data column containing the time
+    :param minutes: size of averaging window in minutes
+    :param data_granularity_minutes: data granularity in minutes
+    :param unk_val: value signaling a missing/unknown value
+    :param fire_every: number of data points after which a partial mean is fired
+    :return: the resulting stream
+    """
+
+    # stream of date and time and value tuples
+    stream_data_annotated = upstream.map(annotation.annotate) \
+        .map(lambda x: (to_standard_format(x[date_col_name], x[time_col_name]), float(x[col_name])))
+
+    # return flattened stream of partial and final means
+    return stream_data_annotated \
+        .map(RunningWindowAggregate(minutes // data_granularity_minutes, aggregate='mean', fire_every=fire_every, unk_val=unk_val)) \
+        .flatten()
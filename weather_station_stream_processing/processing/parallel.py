@@ -0,0 +1,182 @@
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+import numpy as np
+
+from weather_station_stream_processing import constants
+from weather_station_stream_processing.utils import annotation
+from weather_station_stream_processing.utils.datetime import to_standard_format
+from weather_station_stream_processing.utils.file_split import split_line_aligned, read_lines
+
+
+def _map_ranges(func, path: str, n_workers: int, *args) -> list:
+    """Apply a function to line-aligned byte ranges of a file in worker processes.
+
+    :param func: function called with the path, the start and end offsets of a range and the additional arguments
+    :param path: path to the file to process
+    :param n_workers: number of worker processes
+    :param args: additional arguments passed to the function
+    :return: list of results for the ranges in the order in which the ranges appear in the file
+    """
+
+    ranges = split_line_aligned(path, n_workers)
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = [executor.submit(func, path, start, end, *args) for start, end in ranges]
+        return [future.result() for future in futures]
+
+
+def _parse_values(path: str, start: int, end: int, col_name: str, date_col_name: str, time_col_name: str) -> tuple:
+    """Parse datetimes and values in a byte range of a file.
+
+    :return: datetimes (as an array of minute resolution datetimes) and values
+    """
+
+    dts = []
+    vals = []
+    for line in read_lines(path, start, end):
+        pt = annotation.annotate(line)
+        dts.append(to_standard_format(pt[date_col_name], pt[time_col_name]))
+        vals.append(float(pt[col_name]))
+
+    # return datetimes as a compact array rather than a list of datetime instances to reduce the size of the result sent to the parent
+    return np.array(dts, dtype='datetime64[m]'), np.array(vals, dtype=float)
+
+
+def compute_mean_for_minutes_parallel(path: str,
+                                      col_name: str,
+                                      date_col_name: str,
+                                      time_col_name: str,
+                                      minutes: int = 60,
+                                      data_granularity_minutes: int = 5,
+                                      unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND,
+                                      n_workers: int = 4
+                                      ) -> List[Tuple[datetime.datetime, float]]:
+    """Compute mean for minutes by parsing line-aligned byte ranges of a file in worker processes. The windows are
+    formed as in compute_mean_for_minutes, i.e. as consecutive groups of minutes // data_granularity_minutes data points
+    (also if data points are missing), so the windows do not depend on the number of worker processes.
+
+    :param path: path to the file to process
+    :param col_name: name of data column containing the value of interest
+    :param date_col_name: name of data column containing the date
+    :param time_col_name: name of data column containing the time
+    :param minutes: size of averaging window in minutes
+    :param data_granularity_minutes: data granularity in minutes
+    :param unk_val: value signaling a missing/unknown value
+    :param n_workers: number of worker processes
+    :return: list of starting datetimes of the windows and the means as tuples, in timestamp order
+    """
+
+    results = _map_ranges(_parse_values, path, n_workers, col_name, date_col_name, time_col_name)
+    dts = np.concatenate([dts for dts, _ in results])
+    vals = np.concatenate([vals for _, vals in results])
+
+    # as with partitioning the stream, an incomplete trailing window is not emitted
+    n_points = minutes // data_granularity_minutes
+    n_windows = len(vals) // n_points
+    vals = vals[:n_windows * n_points].reshape(n_windows, n_points)
+
+    known = vals != unk_val
+    n_known = known.sum(axis=1)
+    sums = np.where(known, vals, 0.0).sum(axis=1)
+    starts = dts[:n_windows * n_points:n_points].astype(object)
+
+    return [(dt, val_sum / n if n > 0 else unk_val) for dt, val_sum, n in zip(starts, sums.tolist(), n_known.tolist())]
+
+
+def _partial_prefix_sums(path: str, start: int, end: int,
+                         col_name: str, date_col_name: str, time_col_name: str, unk_val) -> tuple:
+    """Parse values in a byte range of a file and compute prefix counts, sums and sums of squares of the known values
+    preceding each value within the range.
+
+    :return: datetimes (as an array of minute resolution datetimes), values, prefix counts, prefix sums and prefix sums of squares
+    """
+
+    dts, vals = _parse_values(path, start, end, col_name, date_col_name, time_col_name)
+    known = vals != unk_val
+    known_vals = np.where(known, vals, 0.0)
+
+    # exclusive prefix sums (statistics of the values preceding each value)
+    counts = np.concatenate(([0], np.cumsum(known)))
+    sums = np.concatenate(([0.0], np.cumsum(known_vals)))
+    sums_sq = np.concatenate(([0.0], np.cumsum(known_vals ** 2)))
+
+    return dts, vals, counts, sums, sums_sq
+
+
+def compute_outliers_parallel(path: str,
+                              col_name: str,
+                              date_col_name: str,
+                              time_col_name: str,
+                              unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND,
+                              std_outlier_criteria: float = 3.0,
+                              n_workers: int = 4
+                              ) -> List[Tuple[Tuple[datetime.datetime, float], bool]]:
+    """Compute outliers by parsing line-aligned byte ranges of a file in worker processes. A value is marked as an
+    outlier as with compute_outliers, i.e. by examining how many standard deviations from the mean of the data
+    preceding it the value lies.
+
+    :param path: path to the file to process
+    :param col_name: name of data column containing the value of interest
+    :param date_col_name: name of data column containing the date
+    :param time_col_name: name of data column containing the time
+    :param unk_val: value signaling a missing/unknown value
+    :param std_outlier_criteria: how many standard deviations away from the mean
+    should a value be considered an outlier
+    :param n_workers: number of worker processes
+    :return: list of date and time and value tuples with flags indicating if a value is an outlier, in timestamp order
+    """
+
+    results = _map_ranges(_partial_prefix_sums, path, n_workers, col_name, date_col_name, time_col_name, unk_val)
+
+    outliers = []
+    count_offset, sum_offset, sum_sq_offset = 0, 0.0, 0.0
+    for dts, vals, counts, sums, sums_sq in results:
+
+        # offset prefix sums of the range by the totals of the preceding ranges
+        counts = counts + count_offset
+        sums = sums + sum_offset
+        sums_sq = sums_sq + sum_sq_offset
+        count_offset, sum_offset, sum_sq_offset = counts[-1], sums[-1], sums_sq[-1]
+
+        # mean and standard deviation of the values preceding each value
+        safe_counts = np.maximum(counts[:-1], 1)
+        means = np.where(counts[:-1] > 0, sums[:-1] / safe_counts, 0.0)
+        variances = np.where(counts[:-1] > 0, sums_sq[:-1] / safe_counts - means ** 2, 0.0)
+        stds = np.sqrt(np.where(variances > 1.0e-16, variances, 0.0))
+
+        flags = (vals > means + std_outlier_criteria * stds) | (vals < means - std_outlier_criteria * stds)
+        outliers.extend(((dt, val), flag) for dt, val, flag in zip(dts.astype(object), vals.tolist(), flags.tolist()))
+
+    return outliers
+
+
+def _partial_counts(path: str, start: int, end: int, col_name: str, counters: tuple) -> tuple:
+    """Pass the values in a byte range of a file to (copies of) counting implementations.
+
+    :return: the updated counting implementations
+    """
+
+    for line in read_lines(path, start, end):
+        val = float(annotation.annotate(line)[col_name])
+        for counter in counters:
+            counter(val)
+    return counters
+
+
+def compute_counts_parallel(path: str, col_name: str, counters: tuple, n_workers: int = 4) -> tuple:
+    """Compute counts by parsing line-aligned byte ranges of a file in worker processes. Each worker updates a copy
+    of the provided counting implementations (e.g. CountMinSketch, CountExact or HyperLogLog instances) which are
+    then merged into the provided instances.
+
+    :param path: path to the file to process
+    :param col_name: name of data column containing the value of interest
+    :param counters: tuple of counting implementations supporting merging (should not yet be updated with any data)
+    :param n_workers: number of worker processes
+    :return: the provided counting implementations updated with the values in the file
+    """
+
+    for partial_counters in _map_ranges(_partial_counts, path, n_workers, col_name, counters):
+        for counter, partial_counter in zip(counters, partial_counters):
+            counter.merge(partial_counter)
+    return counters
@@ -0,0 +1,358 @@
+import math
+from typing import Dict, List, Set, Tuple
+
+from streamz import Stream
+
+from weather_station_stream_processing import constants
+from weather_station_stream_processing.utils import annotation
+from weather_station_stream_processing.utils.datetime import to_standard_format, window_index, window_start
+
+# mean radius of the Earth in kilometers
+_EARTH_RADIUS_KM = 6371.0088
+
+# length of a degree of latitude in kilometers
+_KM_PER_DEG_LAT = math.pi * _EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+    """Compute great-circle distance between two points given by their longitudes and latitudes in degrees.
+
+    :param lon1: longitude of the first point
+    :param lat1: latitude of the first point
+    :param lon2: longitude of the second point
+    :param lat2: latitude of the second point
+    :return: distance between the points in kilometers
+    """
+
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * _EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class StationRegistry:
+    def __init__(self,
+                 cell_size_deg: float = 1.0,
+                 station_col_name: str = constants.STATION_COL_NAME,
+                 lon_col_name: str = constants.LON_COL_NAME,
+                 lat_col_name: str = constants.LAT_COL_NAME
+                 ):
+        """Registry of stations and their coordinates with a grid spatial index. The registry can be built from incoming
+        data by calling it with annotated data points.
+
+        :param cell_size_deg: size of the grid cells in degrees
+        :param station_col_name: name of data column containing the station identifier
+        :param lon_col_name: name of data column containing the longitude
+        :param lat_col_name: name of data column containing the latitude
+        """
+
+        self.cell_size_deg = cell_size_deg
+
+        self.station_col_name = station_col_name
+        self.lon_col_name = lon_col_name
+        self.lat_col_name = lat_col_name
+
+        self._n_lon_cells = math.ceil(360 / self.cell_size_deg)
+
+        # mapping of station identifiers to their coordinates and mapping of grid cells to the stations in them
+        self._stations = dict()
+        self._grid = dict()
+
+    def cell(self, lon: float, lat: float) -> Tuple[int, int]:
+        """Get grid cell containing a given point.
+
+        :param lon: longitude of the point
+        :param lat: latitude of the point
+        :return: indices of the grid cell
+        """
+        return int((lon + 180) // self.cell_size_deg) % self._n_lon_cells, int((lat + 90) // self.cell_size_deg)
+
+    def register(self, station, lon: float, lat: float) -> bool:
+        """Register a station.
+
+        :param station: station identifier
+        :param lon: longitude of the station
+        :param lat: latitude of the station
+        :return: True if the station was not registered before and False otherwise
+        """
+
+        if station in self._stations:
+            return False
+        self._stations[station] = (lon, lat)
+        self._grid.setdefault(self.cell(lon, lat), set()).add(station)
+        return True
+
+    def coordinates(self, station) -> Tuple[float, float]:
+        """Get coordinates of a registered station.
+
+        :param station: station identifier
+        :return: longitude and latitude of the station
+        """
+        return self._stations[station]
+
+    def cells_within(self, lon: float, lat: float, radius_km: float) -> List[Tuple[int, int]]:
+        """Get grid cells that can contain points within a given distance of a point.
+
+        :param lon: longitude of the point
+        :param lat: latitude of the point
+        :param radius_km: distance in kilometers
+        :return: list of indices of the grid cells
+        """
+
+        # range of latitudes and grid cell rows covering the circle
+        d_lat = radius_km / _KM_PER_DEG_LAT
+        min_lat, max_lat = max(-90.0, lat - d_lat), min(90.0, lat + d_lat)
+        rows = range(self.cell(0, min_lat)[1], self.cell(0, max_lat)[1] + 1)
+
+        # range of grid cell columns covering the circle (all columns if the circle contains a pole)
+        max_abs_lat = max(abs(min_lat), abs(max_lat))
+        if max_abs_lat >= 90.0 or d_lat / math.cos(math.radians(max_abs_lat)) >= 180:
+            cols = range(self._n_lon_cells)
+        else:
+            d_lon = d_lat / math.cos(math.radians(max_abs_lat))
+            first_col = int((lon - d_lon + 180) // self.cell_size_deg)
+            last_col = int((lon + d_lon + 180) // self.cell_size_deg)
+            cols = {col % self._n_lon_cells for col in range(first_col, last_col + 1)}
+
+        return [(col, row) for col in cols for row in rows]
+
+    def query_radius(self, lon: float, lat: float, radius_km: float) -> Set:
+        """Get stations within a given distance of a point. Only the grid cells that can contain such stations are examined.
+
+        :param lon: longitude of the point
+        :param lat: latitude of the point
+        :param radius_km: distance in kilometers
+        :return: set of identifiers of the stations within the distance
+        """
+
+        res = set()
+        for cell in self.cells_within(lon, lat, radius_km):
+            for station in self._grid.get(cell, ()):
+                if haversine_km(lon, lat, *self._stations[station]) <= radius_km:
+                    res.add(station)
+        return res
+
+    def stations(self):
+        """Get identifiers of the registered stations.
+
+        :return: view of the identifiers of the registered stations
+        """
+        return self._stations.keys()
+
+    def __len__(self):
+        return len(self._stations)
+
+    def __call__(self, pt):
+        """Register the station of an annotated data point.
+
+        :param pt: annotated data point
+        :return: the data point
+        """
+        self.register(pt[self.station_col_name], float(pt[self.lon_col_name]), float(pt[self.lat_col_name]))
+        return pt
+
+
+class RegionWindowAggregate:
+    def __init__(self,
+                 registry: StationRegistry,
+                 regions: Dict[str, Tuple[float, float, float]],
+                 col_name: str,
+                 date_col_name: str,
+                 time_col_name: str,
+                 aggregate: str = 'max',
+                 minutes: int = 60,
+                 data_granularity_minutes: int = 5,
+                 unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND
+                 ):
+        """Aggregate values of the stations in regions over windows of time. Called with annotated data points from an
+        interleaved stream of stations ordered by time. Data points of stations outside all regions do not touch any state.
+
+        The regions are indexed by the cells of the grid of the registry that their circles overlap, so only the regions
+        overlapping the grid cell of a new station are examined when resolving the regions containing it. The regions
+        containing the stations already in the registry are resolved using the spatial index of the registry.
+
+        :param registry: station registry in which the incoming stations are registered
+        :param regions: mapping of region names to longitudes and latitudes of their centers and their radii in kilometers
+        :param col_name: name of data column containing the value of interest
+        :param date_col_name: name of data column containing the date
+        :param time_col_name: name of data column containing the time
+        :param aggregate: aggregate to compute. Valid values are 'max' and 'mean'
+        :param minutes: size of the window in minutes
+        :param data_granularity_minutes: data granularity in minutes
+        :param unk_val: value signaling a missing/unknown value
+        """
+
+        if aggregate not in {'max', 'mean'}:
+            raise ValueError('Value of argument aggregate should be \'max\' or \'mean\'.')
+
+        self._registry = registry
+        self._regions = regions
+        self._col_name = col_name
+        self._date_col_name = date_col_name
+        self._time_col_name = time_col_name
+        self._aggregate = aggregate
+        self._minutes = minutes
+        self._data_granularity_minutes = data_granularity_minutes
+        self._unk_val = unk_val
+
+        # mapping of grid cells to the regions whose circles overlap them
+        self._region_grid = dict()
+        for region, (center_lon, center_lat, radius_km) in self._regions.items():
+            for cell in self._registry.cells_within(center_lon, center_lat, radius_km):
+                self._region_grid.setdefault(cell, []).append(region)
+
+        # mapping of stations to the regions containing them (resolved for the stations already in the registry)
+        station_regions = {station: [] for station in self._registry.stations()}
+        for region, (center_lon, center_lat, radius_km) in self._regions.items():
+            for station in self._registry.query_radius(center_lon, center_lat, radius_km):
+                station_regions[station].append(region)
+        self._station_regions = {station: tuple(regions) for station, regions in station_regions.items()}
+
+        # state of the current window for each region (window index, sum, count, maximum, station with maximum)
+        self._state = {region: [None, 0.0, 0, None, None] for region in self._regions}
+
+    def _regions_of(self, station) -> tuple:
+        """Get regions containing a registered station by checking its distance to the centers of the regions overlapping
+        its grid cell.
+
+        :param station: station identifier
+        :return: tuple of names of the regions containing the station (empty if the station is outside all regions)
+        """
+        lon, lat = self._registry.coordinates(station)
+        return tuple(region for region in self._region_grid.get(self._registry.cell(lon, lat), ())
+                     if haversine_km(*self._regions[region][:2], lon, lat) <= self._regions[region][2])
+
+    def _result(self, region, state):
+        """Get result for the window of a region.
+
+        :param region: name of the region
+        :param state: state of the window
+        :return: the region, the starting datetime of the window and the maximum and the station with the maximum or the mean
+        """
+        dt = window_start(state[0], self._minutes, self._data_granularity_minutes)
+        if self._aggregate == 'max':
+            return region, dt, state[3] if state[2] > 0 else self._unk_val, state[4]
+        else:
+            return region, dt, state[1] / state[2] if state[2] > 0 else self._unk_val
+
+    def __call__(self, pt):
+        """Pass next annotated data point to the aggregation.
+
+        :param pt: annotated data point
+        :return: list of results for the windows completed by the data point
+        """
+
+        station = pt[self._registry.station_col_name]
+        if station not in self._station_regions:
+            self._registry.register(station, float(pt[self._registry.lon_col_name]), float(pt[self._registry.lat_col_name]))
+            self._station_regions[station] = self._regions_of(station)
+
+        res = []
+        regions = self._station_regions[station]
+        if not regions:
+            return res
+
+        idx = window_index(to_standard_format(pt[self._date_col_name], pt[self._time_col_name]), self._minutes, self._data_granularity_minutes)
+        val = float(pt[self._col_name])
+        for region in regions:
+            state = self._state[region]
+
+            # data points arriving after their window was completed are dropped
+            if state[0] is not None and idx < state[0]:
+                continue
+            if state[0] != idx:
+                if state[0] is not None:
+                    res.append(self._result(region, state))
+                state[:] = [idx, 0.0, 0, None, None]
+
+            if val != self._unk_val:
+                state[1] += val
+                state[2] += 1
+                if state[3] is None or val > state[3]:
+                    state[3] = val
+                    state[4] = station
+
+        return res
+
+
+def compute_region_max_for_minutes(upstream: Stream,
+                                   regions: Dict[str, Tuple[float, float, float]],
+                                   col_name: str,
+                                   date_col_name: str,
+                                   time_col_name: str,
+                                   minutes: int = 60,
+                                   data_granularity_minutes: int = 5,
+                                   unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND,
+                                   registry: StationRegistry = None
+                                   ) -> Stream:
+    """Compute maximum among the stations in regions for minutes. The upstream interleaves data points of stations ordered by time.
+    The stream returns the region name, the starting datetime of the window, the maximum and the station with the maximum as a tuple.
+
+    :param upstream: upstream
+    :param regions: mapping of region names to longitudes and latitudes of their centers and their radii in kilometers
+    :param col_name: name of data column containing the value of interest
+    :param date_col_name: name of data column containing the date
+    :param time_col_name: name of data column containing the time
+    :param minutes: size of window in minutes
+    :param data_granularity_minutes: data granularity in minutes
+    :param unk_val: value signaling a missing/unknown value
+    :param registry: station registry to populate with the incoming stations (a new registry is used if not specified)
+    :return: the resulting stream
+    """
+
+    aggregate = RegionWindowAggregate(
+        registry if registry is not None else StationRegistry(),
+        regions,
+        col_name,
+        date_col_name,
+        time_col_name,
+        aggregate='max',
+        minutes=minutes,
+        data_granularity_minutes=data_granularity_minutes,
+        unk_val=unk_val
+    )
+
+    # return flattened stream of results for completed windows
+    return upstream.map(annotation.annotate).map(aggregate).flatten()
+
+
+def compute_region_mean_for_minutes(upstream: Stream,
+                                    regions: Dict[str, Tuple[float, float, float]],
+                                    col_name: str,
+                                    date_col_name: str,
+                                    time_col_name: str,
+                                    minutes: int = 60,
+                                    data_granularity_minutes: int = 5,
+                                    unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND,
+                                    registry: StationRegistry = None
+                                    ) -> Stream:
+    """Compute mean over the stations in regions for minutes. The upstream interleaves data points of stations ordered by time.
+    The stream returns the region name, the starting datetime of the window and the mean as a tuple.
+
+    :param upstream: upstream
+    :param regions: mapping of region names to longitudes and latitudes of their centers and their radii in kilometers
+    :param col_name: name of data column containing the value of interest
+    :param date_col_name: name of data column containing the date
+    :param time_col_name: name of data column containing the time
+    :param minutes: size of window in minutes
+    :param data_granularity_minutes: data granularity in minutes
+    :param unk_val: value signaling a missing/unknown value
+    :param registry: station registry to populate with the incoming stations (a new registry is used if not specified)
+    :return: the resulting stream
+    """
+
+    aggregate = RegionWindowAggregate(
+        registry if registry is not None else StationRegistry(),
+        regions,
+        col_name,
+        date_col_name,
+        time_col_name,
+        aggregate='mean',
+        minutes=minutes,
+        data_granularity_minutes=data_granularity_minutes,
+        unk_val=unk_val
+    )
+
+    # return flattened stream of results for completed windows
+    return upstream.map(annotation.annotate).map(aggregate).flatten()
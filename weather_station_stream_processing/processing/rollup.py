@@ -0,0 +1,371 @@
+import datetime
+import glob
+import os
+from typing import List, Tuple
+
+import numpy as np
+from streamz import Stream
+
+from weather_station_stream_processing import constants
+from weather_station_stream_processing.utils import annotation
+from weather_station_stream_processing.utils.datetime import EPOCH, to_standard_format, window_index, window_start
+
+# resolutions of the rollups from the finest to the coarsest
+RESOLUTIONS = ('hour', 'day', 'month')
+
+# size of the hourly and daily buckets in minutes
+_BUCKET_MINUTES = {'hour': 60, 'day': 24 * 60}
+
+# row of the statistics of an empty bucket (sum, count, minimum, maximum)
+_EMPTY_ROW = (0.0, 0.0, np.inf, -np.inf)
+
+
+def _month_key(dt: datetime.datetime) -> int:
+    """Get index of the month containing a given datetime (months since the start of year 0)."""
+    return dt.year * 12 + dt.month - 1
+
+
+def _start(resolution: str, key: int) -> datetime.datetime:
+    """Get starting datetime of the bucket with a given index at a given resolution."""
+    if resolution == 'month':
+        return datetime.datetime(key // 12, key % 12 + 1, 1)
+    return window_start(key, _BUCKET_MINUTES[resolution], 0)
+
+
+def _hour_key_of_month(month_key: int) -> int:
+    """Get index of the first hour of the month with a given index."""
+    return window_index(_start('month', month_key), 60, 0)
+
+
+class _Buckets:
+    def __init__(self, first_key: int, initial_capacity: int = 64):
+        """Statistics (sum, count, minimum and maximum) of consecutive buckets of a station stored in a numpy array.
+
+        :param first_key: index of the first bucket
+        :param initial_capacity: initial number of rows (the capacity is doubled when needed)
+        """
+        self.first_key = first_key
+        self.n = 0
+        self.stats = np.tile(np.array(_EMPTY_ROW), (initial_capacity, 1))
+
+    def row(self, key: int) -> np.ndarray:
+        """Get row of the bucket with a given index, growing the array if needed."""
+        if key < self.first_key:
+            n_prepend = self.first_key - key
+            self.stats = np.concatenate((np.tile(np.array(_EMPTY_ROW), (n_prepend, 1)), self.stats))
+            self.first_key = key
+            self.n += n_prepend
+        idx = key - self.first_key
+        if idx >= len(self.stats):
+            capacity = max(2 * len(self.stats), idx + 1)
+            self.stats = np.concatenate((self.stats, np.tile(np.array(_EMPTY_ROW), (capacity - len(self.stats), 1))))
+        self.n = max(self.n, idx + 1)
+        return self.stats[idx]
+
+    def get(self, key: int):
+        """Get row of the bucket with a given index or None if the bucket is empty."""
+        idx = key - self.first_key
+        if 0 <= idx < self.n and self.stats[idx, 1] > 0:
+            return self.stats[idx]
+        return None
+
+
+class RollupStore:
+    def __init__(self,
+                 path: str = None,
+                 data_granularity_minutes: int = constants.DATA_GRANULARITY_MIN,
+                 unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND,
+                 max_segments: int = 16
+                 ):
+        """Store of pre-aggregated sums, counts, minima and maxima of values for each station at hourly, daily and monthly
+        resolution. The statistics of the buckets of each station are kept in numpy arrays.
+
+        The store is saved to a directory of segment files. Each save only writes the buckets that changed since the previous
+        save to a new segment, and the segments are applied in order when the store is loaded. Once there are more than
+        max_segments segments, they are merged into a single segment (see compact) so that the number of files and the cost
+        of loading the store stay bounded.
+
+        Data points are timestamped at the end of their measurement intervals so a bucket starting at a full hour contains the data
+        points timestamped after it up to and including the next full hour. Data points of a station that are not later than the
+        latest data point of the station already in the store are ignored so that re-streaming a file to which data was appended
+        only adds the new data.
+
+        :param path: path to the directory in which the store is saved (loaded if it exists)
+        :param data_granularity_minutes: data granularity in minutes
+        :param unk_val: value signaling a missing/unknown value
+        :param max_segments: number of segments after which the segments are merged into a single segment when saving
+        """
+
+        if max_segments < 1:
+            raise ValueError('The number of segments after which the segments are merged should be positive.')
+
+        self.path = path
+        self.data_granularity_minutes = data_granularity_minutes
+        self.unk_val = unk_val
+        self.max_segments = max_segments
+
+        # mapping of resolutions to mappings of stations to their buckets
+        self._rollups = {resolution: dict() for resolution in RESOLUTIONS}
+
+        # mapping of stations to the datetimes of their latest data points in the store
+        self._watermarks = dict()
+
+        # mapping of resolutions to mappings of stations to the indices of their first buckets changed since the last save and
+        # stations whose watermarks changed since the last save
+        self._dirty = {resolution: dict() for resolution in RESOLUTIONS}
+        self._dirty_watermarks = set()
+
+        # paths of the segment files of the store in the order in which they were written and index of the next segment
+        self._segment_paths = []
+        self._next_segment = 0
+
+        if self.path is not None and os.path.isdir(self.path):
+            self._segment_paths = sorted(glob.glob(os.path.join(self.path, 'segment-*.npz')))
+            if self._segment_paths:
+                self._next_segment = int(os.path.basename(self._segment_paths[-1])[len('segment-'):-len('.npz')]) + 1
+            self._load()
+
+    def _load(self):
+        """Load the store by applying its segments in order."""
+        for segment_path in self._segment_paths:
+            with np.load(segment_path) as data:
+                for resolution in RESOLUTIONS:
+                    offset = 0
+                    for station, first_key, n in zip(data[resolution + '_station'], data[resolution + '_first_key'], data[resolution + '_n']):
+                        station, first_key, n = str(station), int(first_key), int(n)
+                        if n == 0:
+                            continue
+                        buckets = self._rollups[resolution].setdefault(station, _Buckets(first_key))
+                        buckets.row(first_key + n - 1)
+                        buckets.row(first_key)
+                        idx = first_key - buckets.first_key
+                        buckets.stats[idx:idx + n] = data[resolution + '_stats'][offset:offset + n]
+                        offset += n
+                for station, watermark in zip(data['watermark_station'], data['watermark']):
+                    self._watermarks[str(station)] = EPOCH + datetime.timedelta(minutes=int(watermark))
+
+    def _write_segment(self, from_keys: dict, stations):
+        """Write buckets starting at given indices and watermarks of given stations to a new segment file.
+
+        :param from_keys: mapping of resolutions to mappings of stations to the indices of the first buckets to write
+        :param stations: stations whose watermarks to write
+        """
+
+        arrays = dict()
+        for resolution in RESOLUTIONS:
+            blocks = []
+            for station, from_key in from_keys[resolution].items():
+                buckets = self._rollups[resolution][station]
+                from_key = max(from_key, buckets.first_key)
+                blocks.append((station, from_key, buckets.stats[from_key - buckets.first_key:buckets.n]))
+            arrays[resolution + '_station'] = np.array([block[0] for block in blocks], dtype=str)
+            arrays[resolution + '_first_key'] = np.array([block[1] for block in blocks], dtype=np.int64)
+            arrays[resolution + '_n'] = np.array([len(block[2]) for block in blocks], dtype=np.int64)
+            arrays[resolution + '_stats'] = np.concatenate([block[2] for block in blocks]) if blocks else np.zeros((0, 4))
+        stations = list(stations)
+        arrays['watermark_station'] = np.array(stations, dtype=str)
+        arrays['watermark'] = np.array([(self._watermarks[station] - EPOCH) // datetime.timedelta(minutes=1) for station in stations],
+                                       dtype=np.int64)
+
+        # write to a temporary file first so that an interrupted save does not corrupt the store
+        segment_path = os.path.join(self.path, 'segment-{0:08d}.npz'.format(self._next_segment))
+        tmp_path = segment_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, segment_path)
+        self._segment_paths.append(segment_path)
+        self._next_segment += 1
+
+    def _check_path(self):
+        """Check that the store has a path and create its directory if needed."""
+        if self.path is None:
+            raise ValueError('The store should have a path to be saved.')
+        os.makedirs(self.path, exist_ok=True)
+
+    def save(self):
+        """Save the buckets changed since the last save to a new segment. The cost is proportional to the number of changed buckets
+        except for every max_segments-th save which merges the segments (see compact)."""
+
+        self._check_path()
+        if not self._dirty_watermarks:
+            return
+        if len(self._segment_paths) >= self.max_segments:
+            self.compact()
+            return
+        self._write_segment(self._dirty, self._dirty_watermarks)
+        self._dirty = {resolution: dict() for resolution in RESOLUTIONS}
+        self._dirty_watermarks = set()
+
+    def compact(self):
+        """Merge all segments of the store into a single segment. The cost is proportional to the size of the store."""
+
+        self._check_path()
+        old_segment_paths = list(self._segment_paths)
+        from_keys = {resolution: {station: buckets.first_key for station, buckets in self._rollups[resolution].items()}
+                     for resolution in RESOLUTIONS}
+        self._write_segment(from_keys, self._watermarks.keys())
+        self._segment_paths = self._segment_paths[len(old_segment_paths):]
+        for segment_path in old_segment_paths:
+            os.remove(segment_path)
+        self._dirty = {resolution: dict() for resolution in RESOLUTIONS}
+        self._dirty_watermarks = set()
+
+    def update(self, station, dt: datetime.datetime, val: float):
+        """Update the rollups of a station with a data point.
+
+        :param station: station identifier
+        :param dt: datetime of the data point
+        :param val: value of the data point
+        """
+
+        watermark = self._watermarks.get(station)
+        if watermark is not None and dt <= watermark:
+            return
+        self._watermarks[station] = dt
+        self._dirty_watermarks.add(station)
+        if val == self.unk_val:
+            return
+
+        # datetime of the start of the measurement interval used to assign the data point to buckets
+        dt_start = dt - datetime.timedelta(minutes=self.data_granularity_minutes)
+        keys = (window_index(dt, 60, self.data_granularity_minutes),
+                window_index(dt, 24 * 60, self.data_granularity_minutes),
+                _month_key(dt_start))
+        for resolution, key in zip(RESOLUTIONS, keys):
+            buckets = self._rollups[resolution].get(station)
+            if buckets is None:
+                buckets = self._rollups[resolution][station] = _Buckets(key)
+            row = buckets.row(key)
+            row[0] += val
+            row[1] += 1
+            row[2] = min(row[2], val)
+            row[3] = max(row[3], val)
+
+            dirty = self._dirty[resolution]
+            dirty[station] = min(dirty.get(station, key), key)
+
+    def _cover(self, start: datetime.datetime, end: datetime.datetime) -> List[Tuple[str, int]]:
+        """Cover a range of hours with the coarsest buckets that fit in it.
+
+        :param start: start of the range (inclusive, rounded down to the hour)
+        :param end: end of the range (exclusive, rounded down to the hour)
+        :return: list of resolutions and bucket indices covering the range
+        """
+
+        buckets = []
+        hour, end_hour = window_index(start, 60, 0), window_index(end, 60, 0)
+        while hour < end_hour:
+            month_key = _month_key(_start('hour', hour))
+            if hour == _hour_key_of_month(month_key) and _hour_key_of_month(month_key + 1) <= end_hour:
+                buckets.append(('month', month_key))
+                hour = _hour_key_of_month(month_key + 1)
+            elif hour % 24 == 0 and hour + 24 <= end_hour:
+                buckets.append(('day', hour // 24))
+                hour += 24
+            else:
+                buckets.append(('hour', hour))
+                hour += 1
+        return buckets
+
+    def query(self, station, start: datetime.datetime, end: datetime.datetime) -> dict:
+        """Query the store for the aggregates of the values of a station in a range of time. The range is covered with the
+        coarsest buckets that fit in it.
+
+        :param station: station identifier
+        :param start: start of the range (inclusive, rounded down to the hour)
+        :param end: end of the range (exclusive, rounded down to the hour)
+        :return: dictionary with the sum, count, minimum, maximum and mean of the values (the minimum, maximum and mean are
+        equal to the value signaling a missing/unknown value if there are no values in the range)
+        """
+
+        val_sum, count, val_min, val_max = 0.0, 0, np.inf, -np.inf
+        for resolution, key in self._cover(start, end):
+            buckets = self._rollups[resolution].get(station)
+            stats = buckets.get(key) if buckets is not None else None
+            if stats is not None:
+                val_sum += float(stats[0])
+                count += int(stats[1])
+                val_min = min(val_min, float(stats[2]))
+                val_max = max(val_max, float(stats[3]))
+
+        return {
+            'sum': val_sum,
+            'count': count,
+            'min': val_min if count > 0 else self.unk_val,
+            'max': val_max if count > 0 else self.unk_val,
+            'mean': val_sum / count if count > 0 else self.unk_val
+        }
+
+    def series(self, station, resolution: str, start: datetime.datetime = None, end: datetime.datetime = None) -> List[tuple]:
+        """Get the aggregates of the values of a station for each bucket at a given resolution.
+
+        :param station: station identifier
+        :param resolution: resolution of the buckets. Valid values are 'hour', 'day' and 'month'
+        :param start: only include buckets starting at or after this datetime
+        :param end: only include buckets starting before this datetime
+        :return: list of starting datetimes of the buckets, means, minima and maxima as tuples in timestamp order
+        """
+
+        if resolution not in self._rollups:
+            raise ValueError('Value of argument resolution should be \'hour\', \'day\' or \'month\'.')
+
+        res = []
+        buckets = self._rollups[resolution].get(station)
+        if buckets is None:
+            return res
+        for idx in np.flatnonzero(buckets.stats[:buckets.n, 1] > 0):
+            dt = _start(resolution, buckets.first_key + int(idx))
+            if (start is None or dt >= start) and (end is None or dt < end):
+                val_sum, count, val_min, val_max = buckets.stats[idx].tolist()
+                res.append((dt, val_sum / count, val_min, val_max))
+        return res
+
+    def stations(self):
+        """Get identifiers of the stations in the store.
+
+        :return: view of the identifiers of the stations in the store
+        """
+        return self._watermarks.keys()
+
+    def __call__(self, pt):
+        """Update the rollups with the next data point.
+
+        :param pt: tuple of the station identifier, the datetime and the value of the data point
+        """
+        self.update(*pt)
+
+
+def compute_rollups(upstream: Stream,
+                    store: RollupStore,
+                    col_name: str,
+                    date_col_name: str,
+                    time_col_name: str,
+                    station_col_name: str = constants.STATION_COL_NAME,
+                    save_every: int = None
+                    ) -> Tuple[Stream, RollupStore]:
+    """Incrementally maintain hourly, daily and monthly rollups of values. The stream updates the rollup store which can be queried
+    for aggregates over ranges of time.
+
+    :param upstream: upstream
+    :param store: rollup store to update
+    :param col_name: name of data column containing the value of interest
+    :param date_col_name: name of data column containing the date
+    :param time_col_name: name of data column containing the time
+    :param station_col_name: name of data column containing the station identifier
+    :param save_every: if specified, the buckets changed since the last save are saved after every this many data points
+    :return: the resulting stream and the rollup store
+    """
+
+    # annotated stream of station identifiers, datetimes and values
+    stream_data_annotated = upstream.map(annotation.annotate) \
+        .map(lambda x: (x[station_col_name], to_standard_format(x[date_col_name], x[time_col_name]), float(x[col_name])))
+
+    # stream for updating the rollups
+    stream_rollups = stream_data_annotated.sink(store)
+
+    # periodically save the changed buckets
+    if save_every is not None:
+        stream_data_annotated.partition(save_every).sink(lambda _: store.save())
+
+    # return the stream for updating the rollups and the rollup store
+    return stream_rollups, store
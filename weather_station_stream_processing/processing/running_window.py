@@ -0,0 +1,60 @@
+from weather_station_stream_processing import constants
+
+
+class RunningWindowAggregate:
+    def __init__(self, n_points: int, aggregate: str = 'mean', fire_every: int = 1, unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND):
+        """Aggregate values over windows of consecutive data points using running accumulators and fire partial results before
+        the windows are complete. The windows are formed as when partitioning the stream into tuples of n_points data points.
+
+        :param n_points: number of data points in a window
+        :param aggregate: aggregate to compute. Valid values are 'mean' and 'max'
+        :param fire_every: number of data points after which a partial result for the current window is fired
+        :param unk_val: value signaling a missing/unknown value
+        """
+
+        if aggregate not in {'mean', 'max'}:
+            raise ValueError('Value of argument aggregate should be \'mean\' or \'max\'.')
+        if fire_every < 1:
+            raise ValueError('The number of data points after which a partial result is fired should be positive.')
+
+        self._n_points = n_points
+        self._aggregate = aggregate
+        self._fire_every = fire_every
+        self._unk_val = unk_val
+
+        # starting datetime, sum, count and maximum of the known values and number of all data points in the current window
+        self._start = None
+        self._sum = 0.0
+        self._count = 0
+        self._max = None
+        self._n_seen = 0
+
+    def _value(self):
+        """Get the aggregate of the values in the current window seen so far."""
+        if self._count == 0:
+            return self._unk_val
+        return self._sum / self._count if self._aggregate == 'mean' else self._max
+
+    def __call__(self, x):
+        """Pass next datetime and value tuple.
+
+        :param x: datetime and value tuple
+        :return: list of ((starting datetime of the window, aggregate), flag indicating if the result is final) tuples fired
+        """
+
+        dt, val = x
+        if self._n_seen == 0:
+            self._start = dt
+        if val != self._unk_val:
+            self._sum += val
+            self._count += 1
+            self._max = val if self._max is None or val > self._max else self._max
+        self._n_seen += 1
+
+        if self._n_seen == self._n_points:
+            res = [((self._start, self._value()), True)]
+            self._sum, self._count, self._max, self._n_seen = 0.0, 0, None, 0
+            return res
+        elif self._n_seen % self._fire_every == 0:
+            return [((self._start, self._value()), False)]
+        return []
@@ -5,6 +5,10 @@ from streamz import Stream
 from weather_station_stream_processing import constants
 from weather_station_stream_processing.processing.count import compute_exact_count, CountExact
 
+_LOW_BOUND = -10
+_HIGH_BOUND = 30
+_STEP = 5
+
 
 def get_stream_for_compute_count_exact(stream: Stream) -> Tuple[Tuple[Stream, CountExact], tuple]:
     """Get stream for computing counts of bucketed values using the Count-min sketch algorithm.
@@ -13,15 +17,26 @@ def get_stream_for_compute_count_exact(stream: Stream) -> Tuple[Tuple[Stream, Co
     :return: streamz stream for computing the counts using exact counting and the bucketing intervals
     """
 
-    _LOW_BOUND = -10
-    _HIGH_BOUND = 30
-    _STEP = 5
-
     return compute_exact_count(
         stream,
         col_name=constants.TEMP_COL_NAME,
         unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND,
-        low_bound=-10,
-        high_bound=30,
-        step=5
+        low_bound=_LOW_BOUND,
+        high_bound=_HIGH_BOUND,
+        step=_STEP
+    ), tuple(range(_LOW_BOUND, _HIGH_BOUND + _STEP, _STEP))
+
+
+def get_count_exact() -> Tuple[CountExact, tuple]:
+    """Get exact counting implementation instance for computing counts of bucketed values outside a stream (e.g. in worker processes).
+
+    :return: the exact counting implementation instance and the bucketing intervals
+    """
+
+    return CountExact(
+        bucket=True,
+        low_bound=_LOW_BOUND,
+        high_bound=_HIGH_BOUND,
+        step=_STEP,
+        unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND
     ), tuple(range(_LOW_BOUND, _HIGH_BOUND + _STEP, _STEP))
@@ -5,6 +5,10 @@ from streamz import Stream
 from weather_station_stream_processing import constants
 from weather_station_stream_processing.processing.count import compute_min_sketch_count, CountMinSketch
 
+_LOW_BOUND = -10
+_HIGH_BOUND = 30
+_STEP = 5
+
 
 def get_stream_for_compute_count_min_sketch(stream: Stream, w: int, d: int) -> Tuple[Tuple[Stream, CountMinSketch], tuple]:
     """Get stream for computing counts of bucketed values using the Count-min sketch algorithm.
@@ -15,10 +19,6 @@ def get_stream_for_compute_count_min_sketch(stream: Stream, w: int, d: int) -> T
     :return: streamz stream for computing the counts using the min-sketch algorithm and the bucketing intervals
     """
 
-    _LOW_BOUND = -10
-    _HIGH_BOUND = 30
-    _STEP = 5
-
     return compute_min_sketch_count(
         stream,
         col_name=constants.TEMP_COL_NAME,
@@ -29,3 +29,22 @@ def get_stream_for_compute_count_min_sketch(stream: Stream, w: int, d: int) -> T
         high_bound=_HIGH_BOUND,
         step=_STEP
     ), tuple(range(_LOW_BOUND, _HIGH_BOUND + _STEP, _STEP))
+
+
+def get_count_min_sketch(w: int, d: int) -> Tuple[CountMinSketch, tuple]:
+    """Get Count-min sketch implementation instance for computing counts of bucketed values outside a stream (e.g. in worker processes).
+
+    :param w: the w parameter of the Count-min sketch algorithm (number of columns)
+    :param d: the d parameter of the Count-min sketch algorithm (number of rows)
+    :return: the Count-min sketch implementation instance and the bucketing intervals
+    """
+
+    return CountMinSketch(
+        w,
+        d,
+        bucket=True,
+        low_bound=_LOW_BOUND,
+        high_bound=_HIGH_BOUND,
+        step=_STEP,
+        unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND
+    ), tuple(range(_LOW_BOUND, _HIGH_BOUND + _STEP, _STEP))
@@ -1,7 +1,11 @@
+import datetime
+from typing import List, Tuple
+
 from streamz import Stream
 
 from weather_station_stream_processing import constants
-from weather_station_stream_processing.processing.mean import compute_mean_for_minutes
+from weather_station_stream_processing.processing.mean import compute_mean_for_minutes, compute_mean_for_minutes_early_firing
+from weather_station_stream_processing.processing.parallel import compute_mean_for_minutes_parallel
 
 
 def get_stream_for_compute_hourly_mean_temperature(stream: Stream) -> Stream:
@@ -20,3 +24,43 @@ def get_stream_for_compute_hourly_mean_temperature(stream: Stream) -> Stream:
         data_granularity_minutes=constants.DATA_GRANULARITY_MIN,
         unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND
     )
+
+
+def get_stream_for_compute_hourly_mean_temperature_early_firing(stream: Stream, fire_every: int = 1) -> Stream:
+    """Get stream for computing hourly mean temperature with partial means fired before the hours are complete.
+
+    :param stream: source stream
+    :param fire_every: number of data points after which a partial mean is fired
+    :return: streamz stream for computing the partial and final hourly mean temperatures.
+    """
+
+    return compute_mean_for_minutes_early_firing(
+        stream,
+        col_name=constants.TEMP_COL_NAME,
+        date_col_name=constants.DATE_COL_NAME,
+        time_col_name=constants.TIME_COL_NAME,
+        minutes=60,
+        data_granularity_minutes=constants.DATA_GRANULARITY_MIN,
+        unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND,
+        fire_every=fire_every
+    )
+
+
+def compute_hourly_mean_temperature_parallel(dataset_path: str, n_workers: int) -> List[Tuple[datetime.datetime, float]]:
+    """Compute hourly mean temperature (for task 1) by parsing parts of the dataset in worker processes.
+
+    :param dataset_path: path to the dataset
+    :param n_workers: number of worker processes
+    :return: list of starting datetimes of the hours and the hourly mean temperatures in timestamp order
+    """
+
+    return compute_mean_for_minutes_parallel(
+        dataset_path,
+        col_name=constants.TEMP_COL_NAME,
+        date_col_name=constants.DATE_COL_NAME,
+        time_col_name=constants.TIME_COL_NAME,
+        minutes=60,
+        data_granularity_minutes=constants.DATA_GRANULARITY_MIN,
+        unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND,
+        n_workers=n_workers
+    )
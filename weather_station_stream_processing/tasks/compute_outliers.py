@@ -1,7 +1,11 @@
+import datetime
+from typing import List, Tuple
+
 from streamz import Stream
 
 from weather_station_stream_processing import constants
 from weather_station_stream_processing.processing.outliers import compute_outliers
+from weather_station_stream_processing.processing.parallel import compute_outliers_parallel
 
 
 def get_stream_for_compute_outliers(stream: Stream) -> Stream:
@@ -19,3 +23,22 @@ def get_stream_for_compute_outliers(stream: Stream) -> Stream:
         unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND,
         std_outlier_criteria=3.0,
     )
+
+
+def compute_outliers_for_dataset_parallel(dataset_path: str, n_workers: int) -> List[Tuple[Tuple[datetime.datetime, float], bool]]:
+    """Mark outliers (for task 3) by parsing parts of the dataset in worker processes.
+
+    :param dataset_path: path to the dataset
+    :param n_workers: number of worker processes
+    :return: list of date and time and temperature tuples with outlier flags in timestamp order
+    """
+
+    return compute_outliers_parallel(
+        dataset_path,
+        col_name=constants.TEMP_COL_NAME,
+        date_col_name=constants.DATE_COL_NAME,
+        time_col_name=constants.TIME_COL_NAME,
+        unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND,
+        std_outlier_criteria=3.0,
+        n_workers=n_workers
+    )
@@ -0,0 +1,30 @@
+from typing import Dict, Tuple
+
+from streamz import Stream
+
+from weather_station_stream_processing import constants
+from weather_station_stream_processing.processing.region import compute_region_max_for_minutes, StationRegistry
+
+
+def get_stream_for_compute_region_hourly_max_temperature(stream: Stream,
+                                                         regions: Dict[str, Tuple[float, float, float]],
+                                                         registry: StationRegistry = None) -> Stream:
+    """Get stream for computing the hourly maximum temperature among the stations in regions from an interleaved stream of stations.
+
+    :param stream: source stream
+    :param regions: mapping of region names to longitudes and latitudes of their centers and their radii in kilometers
+    :param registry: station registry to populate with the incoming stations
+    :return: streamz stream for computing the hourly maximum temperature and the station with the maximum for each region.
+    """
+
+    return compute_region_max_for_minutes(
+        stream,
+        regions,
+        col_name=constants.TEMP_COL_NAME,
+        date_col_name=constants.DATE_COL_NAME,
+        time_col_name=constants.TIME_COL_NAME,
+        minutes=60,
+        data_granularity_minutes=constants.DATA_GRANULARITY_MIN,
+        unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND,
+        registry=registry
+    )
@@ -3,7 +3,9 @@ from typing import Tuple
 from streamz import Stream
 
 from weather_station_stream_processing import constants
-from weather_station_stream_processing.processing.index_max import compute_index_tuple_max_for_minutes
+from weather_station_stream_processing.processing.index_max import compute_index_tuple_max_for_minutes, \
+    compute_index_tuple_max_for_minutes_early_firing
+from weather_station_stream_processing.processing.keyed import compute_keyed_index_max_for_minutes
 
 
 def get_stream_for_compute_station_with_hourly_max_temperature(streams: Tuple[Stream]) -> Stream:
@@ -21,3 +23,42 @@ def get_stream_for_compute_station_with_hourly_max_temperature(streams: Tuple[St
         minutes=60,
         data_granularity_minutes=constants.DATA_GRANULARITY_MIN
     )
+
+
+def get_stream_for_compute_station_with_hourly_max_temperature_early_firing(streams: Tuple[Stream], fire_every: int = 1) -> Stream:
+    """Get stream for computing index of station with highest hourly temperature with partial results fired before the hours are complete.
+
+    :param streams: tuple of source streams
+    :param fire_every: number of data points after which a partial result is fired
+    :return: streamz stream for computing the partial and final indices of the station with the highest hourly temperature.
+    """
+
+    return compute_index_tuple_max_for_minutes_early_firing(
+        streams,
+        col_name=constants.TEMP_COL_NAME,
+        date_col_name=constants.DATE_COL_NAME,
+        time_col_name=constants.TIME_COL_NAME,
+        minutes=60,
+        data_granularity_minutes=constants.DATA_GRANULARITY_MIN,
+        unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND,
+        fire_every=fire_every
+    )
+
+
+def get_stream_for_compute_station_with_hourly_max_temperature_keyed(stream: Stream) -> Stream:
+    """Get stream for computing the station with highest hourly temperature from a single stream interleaving the data of the stations.
+
+    :param stream: source stream
+    :return: streamz stream for computing the identifier (WBANNO) of the station with the highest hourly temperature.
+    """
+
+    return compute_keyed_index_max_for_minutes(
+        stream,
+        col_name=constants.TEMP_COL_NAME,
+        date_col_name=constants.DATE_COL_NAME,
+        time_col_name=constants.TIME_COL_NAME,
+        key_col_name=constants.STATION_COL_NAME,
+        minutes=60,
+        data_granularity_minutes=constants.DATA_GRANULARITY_MIN,
+        unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND
+    )
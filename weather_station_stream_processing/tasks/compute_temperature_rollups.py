@@ -0,0 +1,26 @@
+from typing import Tuple
+
+from streamz import Stream
+
+from weather_station_stream_processing import constants
+from weather_station_stream_processing.processing.rollup import compute_rollups, RollupStore
+
+
+def get_stream_for_compute_temperature_rollups(stream: Stream, store_path: str, save_every: int = None) -> Tuple[Stream, RollupStore]:
+    """Get stream for maintaining hourly, daily and monthly rollups of temperatures.
+
+    :param stream: source stream
+    :param store_path: path to the directory in which the rollup store is saved (loaded if it exists)
+    :param save_every: if specified, the buckets changed since the last save are saved after every this many data points
+    :return: streamz stream for updating the rollups and the rollup store.
+    """
+
+    return compute_rollups(
+        stream,
+        RollupStore(store_path, data_granularity_minutes=constants.DATA_GRANULARITY_MIN, unk_val=constants.TEMP_COL_NAME_UNK_VAL_IND),
+        col_name=constants.TEMP_COL_NAME,
+        date_col_name=constants.DATE_COL_NAME,
+        time_col_name=constants.TIME_COL_NAME,
+        station_col_name=constants.STATION_COL_NAME,
+        save_every=save_every
+    )
@@ -10,3 +10,48 @@ def to_standard_format(date, time):
     """
 
     return datetime.datetime(int(date[:4]), int(date[4:6]), int(date[6:]), int(time[:2]), int(time[2:]))
+
+
+# reference datetime for indices of windows and buckets
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def window_index(dt: datetime.datetime, minutes: int, data_granularity_minutes: int) -> int:
+    """Get index of the window of a given length to which a data point belongs. The data points are timestamped at the end of
+    their measurement intervals so a window starting at a full hour contains the data points timestamped after it up to and including
+    the next full hour (e.g. 00:05 to 01:00 for hourly windows and a data granularity of 5 minutes).
+
+    :param dt: datetime of the data point
+    :param minutes: size of the window in minutes
+    :param data_granularity_minutes: data granularity in minutes
+    :return: index of the window
+    """
+
+    return (dt - EPOCH - datetime.timedelta(minutes=data_granularity_minutes)) // datetime.timedelta(minutes=minutes)
+
+
+def window_start(idx: int, minutes: int, data_granularity_minutes: int) -> datetime.datetime:
+    """Get datetime of the first data point in the window with a given index (see window_index).
+
+    :param idx: index of the window
+    :param minutes: size of the window in minutes
+    :param data_granularity_minutes: data granularity in minutes
+    :return: datetime of the first data point in the window
+    """
+
+    return EPOCH + datetime.timedelta(minutes=idx * minutes + data_granularity_minutes)
+
+
+def align_to_window(dt: datetime.datetime, minutes: int, data_granularity_minutes: int) -> datetime.datetime:
+    """Get datetime of the first data point of the first window (see window_index) starting at or after a given datetime.
+
+    :param dt: the datetime
+    :param minutes: size of the window in minutes
+    :param data_granularity_minutes: data granularity in minutes
+    :return: datetime of the first data point of the window
+    """
+
+    idx = window_index(dt, minutes, data_granularity_minutes)
+    if window_start(idx, minutes, data_granularity_minutes) < dt:
+        idx += 1
+    return window_start(idx, minutes, data_granularity_minutes)
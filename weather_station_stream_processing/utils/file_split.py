@@ -0,0 +1,48 @@
+import os
+from typing import Iterator, List, Tuple
+
+
+def split_line_aligned(path: str, n_ranges: int) -> List[Tuple[int, int]]:
+    """Split a file into byte ranges of roughly equal size such that each range starts at the beginning of a line
+    and ends after the end of a line.
+
+    :param path: path to the file to split
+    :param n_ranges: number of ranges into which to split the file (fewer ranges are returned for small files)
+    :return: list of (start, end) byte offsets of the ranges
+    """
+
+    size = os.path.getsize(path)
+    boundaries = [0]
+    with open(path, 'rb') as f:
+        for idx in range(1, n_ranges):
+            pos = size * idx // n_ranges
+            if pos <= boundaries[-1]:
+                continue
+
+            # move to the start of the next line (or stay if the position is already at the start of a line)
+            f.seek(pos - 1)
+            f.readline()
+            pos = f.tell()
+            if boundaries[-1] < pos < size:
+                boundaries.append(pos)
+    boundaries.append(size)
+
+    return [(boundaries[idx], boundaries[idx + 1]) for idx in range(len(boundaries) - 1)]
+
+
+def read_lines(path: str, start: int, end: int) -> Iterator[str]:
+    """Read the lines contained in a line-aligned byte range of a file one by one.
+
+    :param path: path to the file
+    :param start: start byte offset of the range
+    :param end: end byte offset of the range
+    :return: generator of lines in the range
+    """
+
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                return
+            yield line.decode()
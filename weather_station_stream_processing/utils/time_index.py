@@ -0,0 +1,144 @@
+import bisect
+import datetime
+import os
+from typing import Iterator, List, Tuple
+
+from weather_station_stream_processing import constants
+from weather_station_stream_processing.utils import annotation
+from weather_station_stream_processing.utils.datetime import to_standard_format
+
+# number of characters of the concatenated date and time representation used as the key for each resolution
+_KEY_LENGTHS = {'day': 8, 'hour': 10}
+
+
+def index_path_for(path: str, resolution: str = 'day') -> str:
+    """Get path of the sidecar time index file for a data file.
+
+    :param path: path to the data file
+    :param resolution: resolution of the index ('day' or 'hour')
+    :return: path to the time index file
+    """
+    return '{0}.{1}.idx'.format(path, resolution)
+
+
+def _key(date: str, time: str, resolution: str) -> str:
+    """Get index key for a given date and time.
+
+    :param date: concatenated character representation of date
+    :param time: concatenated character representation of time
+    :param resolution: resolution of the index ('day' or 'hour')
+    :return: the index key
+    """
+    return (date + time)[:_KEY_LENGTHS[resolution]]
+
+
+def build_time_index(path: str,
+                     resolution: str = 'day',
+                     date_col_name: str = constants.DATE_COL_NAME,
+                     time_col_name: str = constants.TIME_COL_NAME
+                     ) -> Tuple[List[str], List[int]]:
+    """Build a sparse time index recording the byte offset of the first data point of each day or hour in a data file
+    ordered by time and save it to a sidecar file (if the sidecar file cannot be written, the index is only returned).
+
+    :param path: path to the data file
+    :param resolution: resolution of the index. Valid values are 'day' and 'hour'
+    :param date_col_name: name of data column containing the date
+    :param time_col_name: name of data column containing the time
+    :return: the index keys and the corresponding byte offsets
+    """
+
+    if resolution not in _KEY_LENGTHS:
+        raise ValueError('Value of argument resolution should be \'day\' or \'hour\'.')
+
+    keys = []
+    offsets = []
+    with open(path, 'rb') as f:
+        offset = 0
+        for line in f:
+            pt = annotation.annotate(line.decode())
+            if pt:
+                key = _key(pt[date_col_name], pt[time_col_name], resolution)
+                if not keys or key != keys[-1]:
+                    keys.append(key)
+                    offsets.append(offset)
+            offset += len(line)
+
+    # save index along with the size and modification time of the data file used to detect stale indices (the index is
+    # only kept in memory if the sidecar file cannot be written, e.g. if the directory of the data file is read-only)
+    stat = os.stat(path)
+    try:
+        with open(index_path_for(path, resolution), 'w') as f:
+            f.write('{0} {1} {2}\n'.format(resolution, stat.st_size, stat.st_mtime_ns))
+            for key, offset in zip(keys, offsets):
+                f.write('{0} {1}\n'.format(key, offset))
+    except OSError:
+        pass
+
+    return keys, offsets
+
+
+def load_time_index(path: str, resolution: str = 'day') -> Tuple[List[str], List[int]]:
+    """Load the sparse time index for a data file. The index is built if it does not exist or if it is stale.
+
+    :param path: path to the data file
+    :param resolution: resolution of the index. Valid values are 'day' and 'hour'
+    :return: the index keys and the corresponding byte offsets
+    """
+
+    index_path = index_path_for(path, resolution)
+    if os.path.isfile(index_path):
+        stat = os.stat(path)
+        with open(index_path, 'r') as f:
+            if f.readline().split() == [resolution, str(stat.st_size), str(stat.st_mtime_ns)]:
+                keys = []
+                offsets = []
+                for line in f:
+                    key, offset = line.split()
+                    keys.append(key)
+                    offsets.append(int(offset))
+                return keys, offsets
+    return build_time_index(path, resolution)
+
+
+def read_lines_in_range(path: str,
+                        start: datetime.datetime = None,
+                        end: datetime.datetime = None,
+                        resolution: str = 'day',
+                        date_col_name: str = constants.DATE_COL_NAME,
+                        time_col_name: str = constants.TIME_COL_NAME
+                        ) -> Iterator[str]:
+    """Read the lines of a data file ordered by time with datetimes in a given range. The time index is used to seek to the
+    start of the range so the cost is proportional to the size of the range rather than the size of the file.
+
+    :param path: path to the data file
+    :param start: start of the range (inclusive). The range starts at the beginning of the file if not specified
+    :param end: end of the range (exclusive). The range ends at the end of the file if not specified
+    :param resolution: resolution of the index. Valid values are 'day' and 'hour'
+    :param date_col_name: name of data column containing the date
+    :param time_col_name: name of data column containing the time
+    :return: generator of lines in the range
+    """
+
+    offset = 0
+    if start is not None:
+        keys, offsets = load_time_index(path, resolution)
+
+        # seek to the last indexed day or hour not after the start of the range
+        idx = bisect.bisect_right(keys, start.strftime('%Y%m%d%H%M')[:_KEY_LENGTHS[resolution]]) - 1
+        offset = offsets[idx] if idx >= 0 else 0
+
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            line = line.decode()
+            if start is None and end is None:
+                yield line
+                continue
+            pt = annotation.annotate(line)
+            if not pt:
+                continue
+            dt = to_standard_format(pt[date_col_name], pt[time_col_name])
+            if end is not None and dt >= end:
+                return
+            if start is None or dt >= start:
+                yield line